@@ -0,0 +1,94 @@
+#! /usr/bin/env python3
+
+# Compare finding the last upgrade in a large pacman.log with the old sed scan
+# and with PacmanLog.
+#
+# Writes a synthetic log (100 MB by default) to a temporary directory, then times
+# the sed from days_since_last_pacman_update.sh, PacmanLog's first read (which
+# scans back from the end), a refresh with nothing new, and a refresh after a
+# few lines are appended. The in-process reads are what the qtile widget pays;
+# `pacman_log.py --state` as its own process, the way a shell script would run
+# it, is timed as well.
+#
+#   ./bench_pacman_log.py [--mb N] [--runs N]
+
+import argparse
+import datetime
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from pacman_log import PacmanLog
+
+SED = r"sed -n '/upgrade$/x;${x;s/.\([0-9-]*\).*/\1/p}'"
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pacman_log.py')
+
+
+def write_log(path, size):
+    # A day of installs per block, with a full system upgrade every few days.
+    day = datetime.date(2015, 1, 1)
+    with open(path, 'w') as f:
+        while f.tell() < size:
+            stamp = '[{}T09:15:02+0100]'.format(day.isoformat())
+            if day.toordinal() % 3 == 0:
+                f.write('{} [PACMAN] starting full system upgrade\n'.format(stamp))
+            for i in range(40):
+                f.write('{} [ALPM] upgraded package-{} (1.{}.0-1 -> 1.{}.1-1)\n'.format(stamp, i, i, i))
+            day += datetime.timedelta(days=1)
+    return day
+
+def median_ms(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=int, default=100)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench-pacman-') as tmpdir:
+        path = os.path.join(tmpdir, 'pacman.log')
+        day = write_log(path, args.mb << 20)
+        print('{:.0f} MB log'.format(os.path.getsize(path) / (1 << 20)))
+
+        sed = subprocess.run('{} {}'.format(SED, path), shell=True, capture_output=True, text=True)
+        log = PacmanLog(path)
+        log.refresh()
+        print('  last upgrade: sed {}, PacmanLog {}'.format(sed.stdout.strip(), log.last_upgrade))
+
+        def first_read():
+            PacmanLog(path).refresh()
+
+        def append():
+            with open(path, 'a') as f:
+                f.write('[{}T10:00:00+0100] [PACMAN] starting full system upgrade\n'.format(day))
+                f.write('[{}T10:00:01+0100] [ALPM] upgraded foo (1-1 -> 2-1)\n'.format(day))
+            log.refresh()
+
+        state = os.path.join(tmpdir, 'state.json')
+
+        def cli():
+            subprocess.run([sys.executable, CLI, '--state', state, path], capture_output=True, check=True)
+
+        cli()
+        rows = [
+            ('sed scan', lambda: subprocess.run('{} {}'.format(SED, path), shell=True,
+                capture_output=True)),
+            ('first read', first_read),
+            ('no change', log.refresh),
+            ('append 2 lines', append),
+            ('cli --state', cli),
+        ]
+        for name, fn in rows:
+            print('  {:<16} {:>10.3f} ms'.format(name, median_ms(fn, args.runs)))
+
+if __name__ == "__main__":
+    main()
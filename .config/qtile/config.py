@@ -28,7 +28,7 @@ import os
 import subprocess
 import re
 
-from libqtile import bar, layout, widget, hook
+from libqtile import bar, layout, widget, hook, qtile
 from libqtile.config import Click, Drag, Group, Key, KeyChord, Match, Screen
 from libqtile.lazy import lazy
 from libqtile.utils import guess_terminal
@@ -36,26 +36,46 @@ from libqtile.log_utils import logger
 
 from powerline.bindings.qtile.widget import PowerlineTextBox
 
+from dropbox_status import DropboxStatus
+from pacman_log import PacmanLog
+from poller import Poller
+from window_index import WindowIndex
+
 mod = "mod4"
 
 #####################
 ##    FUNCTIONS    ##
 #####################
 
+# Groups and windows by wm_class and title, kept up to date by the hooks at the
+# end of this file (see window_index.py).
+window_index = WindowIndex()
+
+# Set QTILE_WINDOW_INDEX_DEBUG=1 to check the index against a full scan on every use.
+window_index_debug = bool(os.environ.get("QTILE_WINDOW_INDEX_DEBUG"))
+
 ##
-# Check if the group contains a matching window.
+# Return the window index, building it first if there isn't one yet.
+#
+# Windows added before the groups exist, or before a config reload, are picked up
+# here.
 ##
-def group_contains_window(group, match):
-    for w in group.windows:
-        if w.match(match):
-            return True
-    return False
+def indexed(qtile):
+    if not window_index.order:
+        window_index.rebuild(qtile.groups)
+    elif window_index_debug:
+        problems = window_index.check(qtile.groups)
+        if problems:
+            for problem in problems:
+                logger.warning("window index out of date: %s", problem)
+            window_index.rebuild(qtile.groups)
+    return window_index
 
 ##
 # Check if the group contains no windows.
 ##
-def group_is_empty(group):
-    return len(group.windows) == 0
+def group_is_empty(qtile, group):
+    return indexed(qtile).is_empty(group.name)
 
 ##
 # Focus on the next empty group.
@@ -64,25 +84,29 @@ def group_is_empty(group):
 # will be moved to the new group.
 ##
 def to_next_empty_group(qtile, move_current_window=False):
-    for group in qtile.groups:
-        if group_is_empty(group):
-            if move_current_window:
-                qtile.current_window.togroup(group.name)
-            qtile.current_screen.set_group(group)
-            return
+    name = indexed(qtile).first_empty_group()
+    if name is None:
+        return
+    if move_current_window:
+        qtile.current_window.togroup(name)
+    qtile.current_screen.set_group(qtile.groups_map[name])
 
 ##
 # Find an existing window, or open it if it doesn't exist.
 #
-# If there is an existing window matching `name`, switch to whatever group it's in.
-# Otherwise, launch the program. If `empty_group` is True, the program will be
-# launched in the next available empty group, if one exists.
+# If there is an existing window with `name` in its wm_class (or, if `title` is given,
+# a title that pattern matches at the start), switch to whatever group it's in. Otherwise, launch
+# the program. If `empty_group` is True, the program will be launched in the next
+# available empty group, if one exists.
 ##
-def focus_or_open(qtile, name, empty_group=False, match=None):
-    for group in qtile.groups:
-        if group_contains_window(group, match or Match(wm_class=name)):
-            qtile.current_screen.set_group(group)
-            return
+def focus_or_open(qtile, name, empty_group=False, title=None):
+    if title is not None:
+        group_name = indexed(qtile).group_with_title(title)
+    else:
+        group_name = indexed(qtile).group_with_class(name)
+    if group_name is not None:
+        qtile.current_screen.set_group(qtile.groups_map[group_name])
+        return
     if empty_group:
         to_next_empty_group(qtile)
     qtile.cmd_spawn(name)
@@ -102,7 +126,7 @@ def to_next_screen(qtile, move_current_window=False):
 def rotate_screens(qtile, skip_empty=False):
     screens = qtile.screens
     if skip_empty:
-        screens = [screen for screen in screens if not group_is_empty(screen.group)]
+        screens = [screen for screen in screens if not group_is_empty(qtile, screen.group)]
     groups = [screen.group for screen in screens]
     groups = groups[1:] + groups[:1]
     for i in range(len(groups)):
@@ -169,7 +193,7 @@ keys = [
         Key([], "t", lazy.function(focus_or_open, "todoist", empty_group=True)),
         Key([], "m", lazy.function(focus_or_open, "minecraft-launcher",
             empty_group=True,
-            match=Match(title=re.compile("Minecraft")))),
+            title=re.compile("Minecraft"))),
     ]),
     
     # System controls.
@@ -241,30 +265,40 @@ widget_defaults = dict(
 )
 extension_defaults = widget_defaults.copy()
 
+# Providers for the bar run on poller's threads; widgets only read the last value.
+# Poller.replace() also shuts down the poller from before a config reload.
+poller = Poller.replace()
+
+dropbox_status = DropboxStatus()
+# Close the daemon connection with the poller, on shutdown or the next reload.
+poller.on_shutdown.append(dropbox_status.close)
+
 ##
 # Return text for dropbox widget.
+#
+# Asks the Dropbox daemon over a connection that stays open between polls (see
+# dropbox_status.py). GenPollText only redraws when the text changes.
 ##
 def dropbox_widget_text():
-    cmd = "dropbox-cli status 2>/dev/null | grep Syncing"
-    try:
-        output = subprocess.check_output(cmd, shell=True, text=True)
-        output = output.replace("\n", "")
-    except subprocess.CalledProcessError:
-        output = ""
-    return "Syncing..." if output else "✓" 
+    return dropbox_status.text()
+
+pacman_log = PacmanLog()
 
 ##
 # Return text for pacman widget.
+#
+# Only reads what was appended to pacman.log since the last poll (see pacman_log.py).
 ##
 def pacman_widget_text():
-    cmd = os.path.expanduser('~/.config/qtile/scripts/days_since_last_pacman_update.sh')
-    try:
-        output = subprocess.check_output(cmd, shell=True, text=True)
-        return output.replace("\n", "")
-    except subprocess.CalledProcessError:
-        return "?"
+    days = pacman_log.days_since_upgrade()
+    return str(days) if days is not None else "?"
+
+# Each of these runs once per interval on poller's threads.
+dropbox_provider = poller.add("dropbox", dropbox_widget_text, interval=1, timeout_secs=2)
+pacman_provider = poller.add("pacman", pacman_widget_text, interval=10)
 
 # Widgets that appear on the right side of the bar, and are shared between all screens.
+# Qtile draws mirrors of them on every bar after the first, so each one polls once.
 right_widgets = [
 
     # CMUS widget
@@ -306,7 +340,7 @@ right_widgets = [
     ),
     widget.GenPollText(
         background          = bar_highlight_color,
-        func                = dropbox_widget_text,
+        func                = dropbox_provider.text,
         update_interval     = 1,
     ),
 
@@ -317,8 +351,8 @@ right_widgets = [
     ),
     widget.GenPollText(
         background          = bar_highlight_color,
-        func                = pacman_widget_text,
-        update_interval     = 10,
+        func                = pacman_provider.text,
+        update_interval     = 1,
     ),
 
     # Volume widget
@@ -337,89 +371,40 @@ right_widgets = [
     ),
 ]
 
-screens = [
-
-    Screen(bottom=bar.Bar([
-                widget.CurrentScreen(
-                    active_text = '🟢',
-                    inactive_text = '⭕',
-                ),
-                widget.GroupBox(
-                    highlight_method            = "line",
-                    hide_unused                 = True,
-                    use_mouse_wheel             = False,
-                    active                      = bar_highlight_color[0],
-                    block_highlight_text_color  = bar_foreground_color,
-                    highlight_color             = bar_highlight_color,
-                    other_current_screen_border = bar_background_color[0],
-                    other_screen_border         = bar_background_color[0],
-                    this_current_screen_border  = bar_highlight_color[0],
-                    this_screen_border          = bar_highlight_color[0],
-                ),
-                widget.Spacer(length=bar.STRETCH),
-            ] + right_widgets,
-            bar_width,
-            border_width=bar_border_width,
-            border_color=bar_border_color,
-            background=bar_background_color,
-            margin=bar_margin,
-        ),
-    ),
-
-    Screen(bottom=bar.Bar([
-                widget.CurrentScreen(
-                    active_text = '🟢',
-                    inactive_text = '⭕',
-                ),
-                widget.GroupBox(
-                    highlight_method            = "line",
-                    hide_unused                 = True,
-                    use_mouse_wheel             = False,
-                    active                      = bar_highlight_color[0],
-                    block_highlight_text_color  = bar_foreground_color,
-                    highlight_color             = bar_highlight_color,
-                    other_current_screen_border = bar_background_color[0],
-                    other_screen_border         = bar_background_color[0],
-                    this_current_screen_border  = bar_highlight_color[0],
-                    this_screen_border          = bar_highlight_color[0],
-                ),
-                widget.Spacer(length=bar.STRETCH),
-            ] + right_widgets,
-            bar_width,
-            border_width=bar_border_width,
-            border_color=bar_border_color,
-            background=bar_background_color,
-            margin=bar_margin,
-        ),
-    ),
-
-    Screen(bottom=bar.Bar([
-                widget.CurrentScreen(
-                    active_text = '🟢',
-                    inactive_text = '⭕',
-                ),
-                widget.GroupBox(
-                    highlight_method            = "line",
-                    hide_unused                 = True,
-                    use_mouse_wheel             = False,
-                    active                      = bar_highlight_color[0],
-                    block_highlight_text_color  = bar_foreground_color,
-                    highlight_color             = bar_highlight_color,
-                    other_current_screen_border = bar_background_color[0],
-                    other_screen_border         = bar_background_color[0],
-                    this_current_screen_border  = bar_highlight_color[0],
-                    this_screen_border          = bar_highlight_color[0],
-                ),
-                widget.Spacer(length=bar.STRETCH),
-            ] + right_widgets,
-            bar_width,
-            border_width=bar_border_width,
-            border_color=bar_border_color,
-            background=bar_background_color,
-            margin=bar_margin,
-        ),
-    ),
-]
+##
+# Build the bar for one screen.
+#
+# CurrentScreen and GroupBox show this screen's state, so each bar gets its own;
+# right_widgets are the same objects on every bar.
+##
+def make_bar():
+    return bar.Bar([
+            widget.CurrentScreen(
+                active_text = '🟢',
+                inactive_text = '⭕',
+            ),
+            widget.GroupBox(
+                highlight_method            = "line",
+                hide_unused                 = True,
+                use_mouse_wheel             = False,
+                active                      = bar_highlight_color[0],
+                block_highlight_text_color  = bar_foreground_color,
+                highlight_color             = bar_highlight_color,
+                other_current_screen_border = bar_background_color[0],
+                other_screen_border         = bar_background_color[0],
+                this_current_screen_border  = bar_highlight_color[0],
+                this_screen_border          = bar_highlight_color[0],
+            ),
+            widget.Spacer(length=bar.STRETCH),
+        ] + right_widgets,
+        bar_width,
+        border_width=bar_border_width,
+        border_color=bar_border_color,
+        background=bar_background_color,
+        margin=bar_margin,
+    )
+
+screens = [Screen(bottom=make_bar()) for _ in range(3)]
 
 dgroups_key_binder = None
 dgroups_app_rules = []  # type: list
@@ -459,9 +444,35 @@ wl_input_rules = None
 # java that happens to be on java's whitelist.
 wmname = "LG3D"
 
+# Keep the window index in step with qtile.
+@hook.subscribe.group_window_add
+def index_window_add(group, window):
+    window_index.add(window, group.name)
+
+@hook.subscribe.client_killed
+def index_window_killed(window):
+    window_index.remove(window)
+
+@hook.subscribe.client_name_updated
+def index_window_renamed(window):
+    window_index.rename(window)
+
+@hook.subscribe.addgroup
+@hook.subscribe.delgroup
+@hook.subscribe.startup_complete
+def index_rebuild(*args):
+    # Group changes are rare; start over from the groups qtile has now.
+    window_index.rebuild(qtile.groups)
+
 # Autorun script when qtile starts
 @hook.subscribe.startup
 def autostart():
     autostart_script = os.path.expanduser('~/.config/qtile/scripts/autostart.sh')
     subprocess.call([autostart_script])
 
+
+# Leave a summary of provider run times in the log, and don't wait on a hung provider.
+@hook.subscribe.shutdown
+def stop_poller():
+    poller.log_stats()
+    poller.shutdown()
@@ -0,0 +1,89 @@
+#! /usr/bin/env python3
+
+# A fake Dropbox daemon that answers on a command socket like ~/.dropbox/command_socket.
+#
+# It answers get_dropbox_status with `status`, which can be changed at any time,
+# replies notok to anything else, and counts connections and commands, so a poller
+# can be checked for reusing its connection.
+#
+#   server = FakeDropbox(status='Up to date').start()
+#   status = DropboxStatus(server.socket_path)
+#   ...
+#   server.stop()
+
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+
+
+class FakeDropbox:
+    def __init__(self, socket_path=None, status='Up to date'):
+        if socket_path is None:
+            self.tmpdir = tempfile.TemporaryDirectory(prefix='fake-dropbox-')
+            socket_path = os.path.join(self.tmpdir.name, 'command_socket')
+        self.socket_path = socket_path
+        self.status = status
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.commands = 0
+        self.open_sockets = []
+
+    def start(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                with server.lock:
+                    server.connections += 1
+                    server.open_sockets.append(self.request)
+                while True:
+                    lines = []
+                    while True:
+                        line = self.rfile.readline()
+                        if not line:
+                            return
+                        if line == b'done\n':
+                            break
+                        lines.append(line.decode().rstrip('\n'))
+                    with server.lock:
+                        server.commands += 1
+                    if lines and lines[0] == 'get_dropbox_status':
+                        reply = 'ok\nstatus\t{}\ndone\n'.format(server.status)
+                    else:
+                        reply = 'notok\ndone\n'
+                    self.wfile.write(reply.encode())
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+        self.server = Server(self.socket_path, Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        # Like the daemon exiting: clients see their connections close.
+        self.server.shutdown()
+        self.server.server_close()
+        with self.lock:
+            for sock in self.open_sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        os.unlink(self.socket_path)
+
+
+# Run a fake daemon in the foreground; each line on stdin becomes the new status.
+if __name__ == "__main__":
+    server = FakeDropbox(*sys.argv[1:2]).start()
+    print(server.socket_path, flush=True)
+    try:
+        for line in sys.stdin:
+            server.status = line.rstrip('\n')
+    except KeyboardInterrupt:
+        pass
+    server.stop()
@@ -0,0 +1,162 @@
+#! /usr/bin/env python3
+
+# Days since the last full system upgrade, from pacman.log, without rereading it.
+#
+# PacmanLog finds the last "starting full system upgrade" line once, scanning back
+# from the end of the file, then remembers the file's inode and offset and only
+# parses bytes appended after that. A new inode (rotation), or a file that is
+# smaller or no longer ends the way it did at the offset (truncation), starts the
+# scan over; the last upgrade seen is kept until a newer one turns up. When nothing
+# changed, a refresh is a single stat().
+#
+#   ./pacman_log.py [--state FILE] [log]      # print the day count
+#
+# With --state, the reader's position is saved between runs (and only rewritten when
+# it moves), so repeated runs only read what was appended. Each run still costs an
+# interpreter start, far more than the read itself; see bench_pacman_log.py.
+
+import argparse
+import datetime
+import json
+import os
+
+LOG_PATH = '/var/log/pacman.log'
+UPGRADE = b'upgrade'
+CHUNK_SIZE = 1 << 16
+# Bytes before the offset that are checked to tell an append from a rewrite.
+FINGERPRINT_SIZE = 64
+
+
+def upgrade_date(line):
+    # Lines look like `[2024-03-01T09:15:02+0100] [PACMAN] starting full system upgrade`
+    # (or `[2019-03-01 09:15] ...` in older logs). Returns the date, or None.
+    if not line.rstrip(b'\r').endswith(UPGRADE) or not line.startswith(b'['):
+        return None
+    try:
+        return datetime.date.fromisoformat(line[1:11].decode())
+    except ValueError:
+        return None
+
+
+class PacmanLog:
+    def __init__(self, path=LOG_PATH):
+        self.path = path
+        self.inode = None
+        self.offset = 0
+        self.fingerprint = b''
+        self.last_upgrade = None
+        self.reads = 0
+
+    def state(self):
+        return {'inode': self.inode, 'offset': self.offset, 'fingerprint': self.fingerprint.hex(),
+                'last_upgrade': self.last_upgrade and self.last_upgrade.isoformat()}
+
+    def load_state(self, state):
+        self.inode = state.get('inode')
+        self.offset = state.get('offset', 0)
+        self.fingerprint = bytes.fromhex(state.get('fingerprint', ''))
+        last_upgrade = state.get('last_upgrade')
+        self.last_upgrade = last_upgrade and datetime.date.fromisoformat(last_upgrade)
+
+    def refresh(self):
+        # Returns whether the last upgrade date changed.
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            self.inode = st.st_ino
+            self.offset = 0
+        if st.st_size == self.offset:
+            return False
+
+        before = self.last_upgrade
+        with open(self.path, 'rb') as f:
+            self.reads += 1
+            if self.offset and self.read_fingerprint(f) != self.fingerprint:
+                self.offset = 0
+            if self.offset == 0:
+                self.scan_back(f, st.st_size)
+            else:
+                self.scan_forward(f, st.st_size)
+            self.fingerprint = self.read_fingerprint(f)
+        return self.last_upgrade != before
+
+    def read_fingerprint(self, f):
+        start = max(0, self.offset - FINGERPRINT_SIZE)
+        f.seek(start)
+        return f.read(self.offset - start)
+
+    def scan_back(self, f, size):
+        # Read chunks from the end until a complete upgrade line turns up.
+        end = size
+        tail = b''
+        while end > 0:
+            start = max(0, end - CHUNK_SIZE)
+            f.seek(start)
+            data = f.read(end - start) + tail
+            lines = data.split(b'\n')
+            # The first piece may be the end of a line that started in an earlier chunk.
+            tail = lines.pop(0) if start > 0 else b''
+            for line in reversed(lines):
+                date = upgrade_date(line)
+                if date:
+                    self.found(date)
+                    end = 0
+                    break
+            else:
+                end = start
+        self.offset = self.complete_lines_end(f, size)
+
+    def scan_forward(self, f, size):
+        f.seek(self.offset)
+        data = f.read(size - self.offset)
+        # Leave a partly written last line for next time.
+        complete = data.rfind(b'\n') + 1
+        for line in data[:complete].split(b'\n'):
+            date = upgrade_date(line)
+            if date:
+                self.found(date)
+        self.offset += complete
+
+    def complete_lines_end(self, f, size):
+        # The offset just past the last newline, so a partly written line is read later.
+        f.seek(max(0, size - CHUNK_SIZE))
+        data = f.read()
+        return size - len(data) + data.rfind(b'\n') + 1
+
+    def found(self, date):
+        if self.last_upgrade is None or date >= self.last_upgrade:
+            self.last_upgrade = date
+
+    def days_since_upgrade(self, today=None):
+        self.refresh()
+        if self.last_upgrade is None:
+            return None
+        return ((today or datetime.date.today()) - self.last_upgrade).days
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--state', help='file to keep the reader position in between runs')
+    parser.add_argument('log', nargs='?', default=LOG_PATH)
+    args = parser.parse_args()
+
+    log = PacmanLog(args.log)
+    saved = None
+    if args.state:
+        try:
+            with open(args.state) as f:
+                saved = json.load(f)
+            log.load_state(saved)
+        except (FileNotFoundError, ValueError):
+            pass
+    days = log.days_since_upgrade()
+    if args.state and log.state() != saved:
+        with open(args.state + '.tmp', 'w') as f:
+            json.dump(log.state(), f)
+        os.replace(args.state + '.tmp', args.state)
+    print(days if days is not None else '?')
+
+if __name__ == "__main__":
+    main()
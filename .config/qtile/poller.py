@@ -0,0 +1,235 @@
+#! /usr/bin/env python3
+
+# Run bar providers off the event loop.
+#
+# A provider is a plain function that returns the text for a widget. Poller runs
+# each one on a small thread pool on its own interval, and the widget callback only
+# reads the last value, so a provider that hangs never holds up the bar (or key
+# handling with it):
+#
+#   poller = Poller()
+#   dropbox = poller.add('dropbox', dropbox_status.text, interval=1, timeout_secs=2)
+#   widget.GenPollText(func=dropbox.text, update_interval=1)
+#
+# A run that raises or takes longer than its timeout counts as a failure; the next
+# run is put off twice as long after each failure in a row (up to MAX_BACKOFF_SECS).
+# The last good value is kept, and shown as stale once it is older than
+# `stale_secs`. Run times are recorded per provider, and runs slower than
+# `slow_secs` are logged, so the provider holding things up is easy to find.
+#
+# qtile runs config.py again on every reload, so config.py gets its poller from
+# Poller.replace(), which shuts down the one the previous run made. Things the
+# providers hold open (a socket, say) go in `on_shutdown` to be closed with it.
+#
+#   ./poller.py      # a short demo with a fast, a slow and a failing provider
+
+import concurrent.futures
+import logging
+import threading
+import time
+
+MAX_WORKERS = 4
+MAX_BACKOFF_SECS = 300
+SLOW_SECS = 0.5
+PENDING_TEXT = '…'
+STALE_FORMAT = '{}?'
+
+# Qtile's own logger, so warnings end up in qtile's log.
+logger = logging.getLogger('libqtile')
+
+
+class Provider:
+    def __init__(self, poller, name, func, interval, timeout_secs, stale_secs, slow_secs):
+        self.poller = poller
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout_secs = timeout_secs
+        self.stale_secs = stale_secs
+        self.slow_secs = slow_secs
+
+        # Each bar's widget calls text() from qtile's executor threads, possibly at once.
+        self.lock = threading.Lock()
+        self.value = None
+        self.updated = None
+        self.next_run = 0
+        self.future = None
+        self.started = None
+        self.timed_out = False
+        self.failures = 0
+
+        self.runs = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_secs = 0
+        self.max_secs = 0
+        self.last_secs = None
+
+    def timed(self):
+        # Runs on the pool; the duration is measured there, so a run that is still
+        # waiting for a thread isn't counted as slow.
+        start = time.perf_counter()
+        try:
+            return self.func(), time.perf_counter() - start, None
+        except Exception as e:
+            return None, time.perf_counter() - start, e
+
+    def poll(self, now=None):
+        # Collect a finished run, notice an overdue one, and start the next one if
+        # it's due. Never waits for a run.
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.poll_locked(now)
+
+    def poll_locked(self, now):
+        if self.future is not None:
+            if self.future.done():
+                self.finish(now)
+            elif not self.timed_out and now - self.started > self.timeout_secs:
+                # The thread can't be stopped, so no new run starts until it returns.
+                self.timed_out = True
+                self.timeouts += 1
+                logger.warning('poller: %s timed out after %.1fs', self.name, self.timeout_secs)
+                self.fail(now)
+        if self.future is None and now >= self.next_run:
+            self.started = now
+            self.timed_out = False
+            self.future = self.poller.executor.submit(self.timed)
+
+    def finish(self, now):
+        value, secs, error = self.future.result()
+        self.future = None
+        self.runs += 1
+        self.total_secs += secs
+        self.max_secs = max(self.max_secs, secs)
+        self.last_secs = secs
+        if secs > self.slow_secs:
+            logger.warning('poller: %s took %.2fs', self.name, secs)
+        if error is not None:
+            self.errors += 1
+            logger.warning('poller: %s failed: %r', self.name, error)
+            if not self.timed_out:
+                self.fail(now)
+            return
+        # A late answer is still an answer; the backoff from the timeout stands.
+        self.value = value
+        self.updated = now
+        if not self.timed_out:
+            self.failures = 0
+            self.next_run = self.started + self.interval
+
+    def fail(self, now):
+        self.failures += 1
+        backoff = min(self.interval * 2 ** self.failures, MAX_BACKOFF_SECS)
+        self.next_run = now + max(backoff, self.interval)
+
+    def is_stale(self, now):
+        return self.updated is None or now - self.updated > self.stale_secs
+
+    def text(self):
+        # For GenPollText's func.
+        now = time.monotonic()
+        with self.lock:
+            self.poll_locked(now)
+            value = self.value
+            stale = self.is_stale(now)
+        if value is None:
+            return PENDING_TEXT
+        if stale:
+            return STALE_FORMAT.format(value)
+        return value
+
+    def stats(self):
+        with self.lock:
+            return {
+                'name': self.name,
+                'runs': self.runs,
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+                'mean_ms': self.total_secs / self.runs * 1000 if self.runs else None,
+                'max_ms': self.max_secs * 1000,
+                'last_ms': self.last_secs * 1000 if self.last_secs is not None else None,
+            }
+
+
+class Poller:
+    # The poller made by the last replace(). This module isn't imported again on a reload,
+    # so the next run of config.py finds it here.
+    current = None
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='poller')
+        self.providers = {}
+        # Called by shutdown(), after the pool is shut down.
+        self.on_shutdown = []
+
+    @classmethod
+    def replace(cls, max_workers=MAX_WORKERS):
+        # A new poller in place of the current one, which is shut down.
+        if cls.current is not None:
+            cls.current.shutdown()
+        cls.current = cls(max_workers)
+        return cls.current
+
+    def add(self, name, func, interval, timeout_secs=None, stale_secs=None, slow_secs=SLOW_SECS):
+        # By default a run may take as long as its interval (at least a second), and
+        # a value goes stale after three intervals without a good run.
+        if timeout_secs is None:
+            timeout_secs = max(interval, 1)
+        if stale_secs is None:
+            stale_secs = 3 * max(interval, timeout_secs)
+        provider = Provider(self, name, func, interval, timeout_secs, stale_secs, slow_secs)
+        self.providers[name] = provider
+        return provider
+
+    def stats(self):
+        # Slowest first.
+        rows = [p.stats() for p in self.providers.values()]
+        return sorted(rows, key=lambda row: row['mean_ms'] or 0, reverse=True)
+
+    def log_stats(self):
+        for row in self.stats():
+            logger.info('poller: %(name)s runs=%(runs)d errors=%(errors)d timeouts=%(timeouts)d '
+                        'mean=%(mean_ms)sms max=%(max_ms).1fms', row)
+
+    def shutdown(self):
+        # Don't wait for a hung provider.
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for close in self.on_shutdown:
+            close()
+        self.on_shutdown = []
+
+
+def print_stats(poller):
+    print('{:<10} {:>5} {:>6} {:>8} {:>9} {:>9}'.format(
+        'provider', 'runs', 'errors', 'timeouts', 'mean ms', 'max ms'))
+    for row in poller.stats():
+        mean = '{:.1f}'.format(row['mean_ms']) if row['mean_ms'] is not None else '-'
+        print('{name:<10} {runs:>5} {errors:>6} {timeouts:>8} {0:>9} {max_ms:>9.1f}'.format(mean, **row))
+
+
+# Poll a fast, a slow and a failing provider for a few seconds the way the bar
+# would, and show that reading them never blocks.
+if __name__ == "__main__":
+    logging.basicConfig(format='%(message)s')
+    poller = Poller()
+    count = iter(range(1000))
+    fast = poller.add('fast', lambda: str(next(count)), interval=0.2)
+    slow = poller.add('slow', lambda: time.sleep(2) or 'done', interval=0.5, timeout_secs=1)
+    def broken():
+        raise OSError('no daemon')
+    failing = poller.add('failing', broken, interval=0.2)
+
+    worst = 0
+    end = time.monotonic() + 5
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        texts = [p.text() for p in (fast, slow, failing)]
+        worst = max(worst, time.perf_counter() - start)
+        print('\r' + '  '.join('{}={:<6}'.format(p.name, t) for p, t in zip((fast, slow, failing), texts)),
+              end='', flush=True)
+        time.sleep(0.1)
+    print('\nslowest read of all three: {:.3f} ms'.format(worst * 1000))
+    print_stats(poller)
+    poller.shutdown()
@@ -0,0 +1,184 @@
+#! /usr/bin/env python3
+
+# Which group each window is in, kept up to date from qtile's hooks.
+#
+# Looking a program up by scanning every window of every group (and running a
+# Match on each) is replaced with dict lookups: windows by wm_class entry and by
+# title, the windows of each group, and the set of empty groups. config.py feeds
+# it from group_window_add, client_killed and client_name_updated, and rebuilds it
+# from a full scan when groups are added or removed.
+#
+#   index.group_with_class('discord')      # the first group with such a window
+#   index.first_empty_group()
+#
+# Windows and groups are only used through wid, name, get_wm_class() and group,
+# group.windows, so the index can be exercised without a running qtile.
+#
+#   ./window_index.py      # check the index against a scan after random changes
+
+
+class WindowIndex:
+    def __init__(self):
+        self.order = {}
+        self.windows = {}
+        self.by_class = {}
+        self.by_title = {}
+        self.group_windows = {}
+        self.empty = set()
+
+    def rebuild(self, groups):
+        self.__init__()
+        for position, group in enumerate(groups):
+            self.order[group.name] = position
+            self.group_windows[group.name] = set()
+            self.empty.add(group.name)
+        for group in groups:
+            for window in group.windows:
+                self.add(window, group.name)
+
+    @staticmethod
+    def classes(window):
+        return tuple(window.get_wm_class() or ())
+
+    def add(self, window, group_name):
+        # Also used when a window moves to another group.
+        if window.wid in self.windows:
+            self.remove(window)
+        if group_name not in self.order:
+            return
+        classes = self.classes(window)
+        title = window.name
+        self.windows[window.wid] = (window, group_name, classes, title)
+        for name in classes:
+            self.by_class.setdefault(name, {})[window.wid] = window
+        self.by_title.setdefault(title, {})[window.wid] = window
+        self.group_windows[group_name].add(window.wid)
+        self.empty.discard(group_name)
+
+    def remove(self, window):
+        entry = self.windows.pop(window.wid, None)
+        if entry is None:
+            return
+        _, group_name, classes, title = entry
+        for name in classes:
+            self.drop(self.by_class, name, window.wid)
+        self.drop(self.by_title, title, window.wid)
+        members = self.group_windows[group_name]
+        members.discard(window.wid)
+        if not members:
+            self.empty.add(group_name)
+
+    @staticmethod
+    def drop(mapping, key, wid):
+        windows = mapping.get(key)
+        if windows is not None:
+            windows.pop(wid, None)
+            if not windows:
+                del mapping[key]
+
+    def rename(self, window):
+        entry = self.windows.get(window.wid)
+        if entry is not None and entry[3] != window.name:
+            self.add(window, entry[1])
+
+    def first_group(self, wids):
+        # The group that comes first in qtile.groups, like the old scan found.
+        groups = {self.windows[wid][1] for wid in wids}
+        return min(groups, key=self.order.__getitem__) if groups else None
+
+    def group_with_class(self, name):
+        return self.first_group(self.by_class.get(name, ()))
+
+    def group_with_title(self, pattern):
+        # Anchored at the start of the title, like Match(title=re.compile(...)). Checks
+        # each distinct title once, rather than every window.
+        wids = [wid for title, windows in self.by_title.items()
+                if title and pattern.match(title) for wid in windows]
+        return self.first_group(wids)
+
+    def first_empty_group(self):
+        return min(self.empty, key=self.order.__getitem__) if self.empty else None
+
+    def is_empty(self, group_name):
+        return group_name in self.empty
+
+    def check(self, groups):
+        # Compare with a full scan; returns a list of differences, empty if none.
+        expected = WindowIndex()
+        expected.rebuild(groups)
+        problems = []
+        for name in ('order', 'by_class', 'by_title', 'group_windows', 'empty'):
+            if getattr(self, name) != getattr(expected, name):
+                problems.append('{}: index has {!r}, scan has {!r}'.format(
+                    name, getattr(self, name), getattr(expected, name)))
+        mine = {wid: entry[1:] for wid, entry in self.windows.items()}
+        theirs = {wid: entry[1:] for wid, entry in expected.windows.items()}
+        if mine != theirs:
+            problems.append('windows: index has {!r}, scan has {!r}'.format(mine, theirs))
+        return problems
+
+
+# Move, rename, open and close windows at random, updating the index the way the
+# hooks would, and check it against a full scan after every step.
+if __name__ == "__main__":
+    import random
+    import re
+
+    class FakeWindow:
+        def __init__(self, wid, wm_class, name):
+            self.wid = wid
+            self.wm_class = wm_class
+            self.name = name
+            self.group = None
+
+        def get_wm_class(self):
+            return self.wm_class
+
+    class FakeGroup:
+        def __init__(self, name):
+            self.name = name
+            self.windows = []
+
+    rng = random.Random(1)
+    groups = [FakeGroup(str(i)) for i in range(1, 10)]
+    programs = ['discord', 'steam', 'firefox', 'alacritty', 'todoist']
+    index = WindowIndex()
+    index.rebuild(groups)
+    live = []
+    empty_seen = 0
+    for step in range(5000):
+        action = rng.random()
+        if action < 0.3 or not live:
+            program = rng.choice(programs)
+            window = FakeWindow(step, [program, program.title()], '{} {}'.format(program, step))
+            window.group = rng.choice(groups)
+            window.group.windows.append(window)
+            live.append(window)
+            index.add(window, window.group.name)
+        elif action < 0.6:
+            window = live.pop(rng.randrange(len(live)))
+            window.group.windows.remove(window)
+            index.remove(window)
+        elif action < 0.8:
+            window = rng.choice(live)
+            window.group.windows.remove(window)
+            window.group = rng.choice(groups)
+            window.group.windows.append(window)
+            index.add(window, window.group.name)
+        else:
+            window = rng.choice(live)
+            window.name = rng.choice(['Minecraft {}', 'Not Minecraft {}', '{}']).format(step)
+            index.rename(window)
+
+        problems = index.check(groups)
+        assert not problems, problems
+        for program in programs:
+            scan = next((g.name for g in groups
+                         if any(program in w.get_wm_class() for w in g.windows)), None)
+            assert index.group_with_class(program) == scan
+        scan = next((g.name for g in groups
+                     if any(re.match('Minecraft', w.name) for w in g.windows)), None)
+        assert index.group_with_title(re.compile('Minecraft')) == scan
+        assert index.first_empty_group() == next((g.name for g in groups if not g.windows), None)
+        empty_seen += bool(index.empty)
+    print('ok: 5000 steps, {} windows open, some group empty in {} steps'.format(len(live), empty_seen))
@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+
+# Compare the launcher's modes: one program at a time, --parallel and --async.
+#
+# Runs a made-up program list against a fake sway that maps a window for each
+# `exec` after that program's startup delay, and reports each mode's wall-clock
+# time next to the sum of the delays (what one-at-a-time has to wait) and the
+# longest chain of `after` dependencies (the best any mode can do).
+#
+#   ./bench_launcher.py [--runs N] [--scale F]
+
+import argparse
+import asyncio
+import itertools
+import statistics
+import threading
+import time
+
+from fake_sway import FakeSway, make_fixture
+
+# name: (startup delay in seconds, programs it's after)
+PROGRAMS = {
+    'mail':         (0.30, []),
+    'calendar':     (0.25, ['mail']),
+    'music':        (0.20, []),
+    'visualizer':   (0.10, ['music']),
+    'term_stui':    (0.05, []),
+    'term_htop':    (0.05, ['term_stui']),
+    'chat':         (0.40, []),
+    'todo':         (0.35, []),
+}
+
+
+class LaunchingSway(FakeSway):
+    # Maps a window with app_id `name` `delay` seconds after `exec name`.
+    def __init__(self, fixture, delays):
+        super().__init__(fixture)
+        self.delays = delays
+        self.next_id = itertools.count(100_000)
+
+    def reply(self, msg_type, payload):
+        if msg_type == 0:
+            for cmd in payload.decode().split(';'):
+                cmd = cmd.strip()
+                if cmd.startswith('exec '):
+                    name = cmd[len('exec '):]
+                    threading.Timer(self.delays[name], self.map_window, [name]).start()
+        return super().reply(msg_type, payload)
+
+    def map_window(self, name):
+        con_id = next(self.next_id)
+        self.emit('window', {'change': 'new', 'container': {
+            'id': con_id, 'type': 'con', 'name': name, 'app_id': name, 'pid': con_id,
+            'rect': {'x': 0, 'y': 0, 'width': 800, 'height': 600},
+            'nodes': [], 'floating_nodes': [],
+        }})
+
+
+def critical_path(delays):
+    done = {}
+    for name, (delay, after) in PROGRAMS.items():
+        done[name] = delays[name] + max((done[dep] for dep in after), default=0)
+    return max(done.values())
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1, help='multiply every delay by this')
+    args = parser.parse_args()
+
+    delays = {name: delay * args.scale for name, (delay, _) in PROGRAMS.items()}
+    server = LaunchingSway(make_fixture(outputs=1, workspaces_per_output=2), delays).start()
+    import launcher
+    import swayipc
+    import swayipc_aio
+    launcher.connect(server.socket_path)
+
+    def programs():
+        return [launcher.Program(name=name, cmd=name, workspace='2',
+                    matcher=launcher.match_by_app_id(name), after=after)
+                for name, (_, after) in PROGRAMS.items()]
+
+    def sequential():
+        windows = launcher.open_windows(launcher.sway.get_tree())
+        return [launcher.launch(p, windows) for p in programs()]
+
+    def parallel():
+        windows = launcher.open_windows(launcher.sway.get_tree())
+        return launcher.launch_parallel(programs(), windows)
+
+    def use_async():
+        async def run():
+            conn = await swayipc_aio.connect_async(server.socket_path)
+            await conn.subscribe([swayipc.Event.WINDOW])
+            windows = launcher.open_windows(await conn.get_tree())
+            results = await launcher.launch_all_async(conn, programs(), windows)
+            await conn.close()
+            return results
+        return asyncio.run(run())
+
+    print('{} programs, delays add up to {:.0f} ms, longest `after` chain {:.0f} ms'.format(
+        len(PROGRAMS), sum(delays.values()) * 1000, critical_path(delays) * 1000))
+    for name, fn in [('one at a time', sequential), ('--parallel', parallel), ('--async', use_async)]:
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            results = fn()
+            samples.append((time.perf_counter() - start) * 1000)
+            launched = sum(r.status == 'launched' for r in results)
+            assert launched == len(PROGRAMS), [(r.name, r.status) for r in results]
+        print('  {:<16} {:>8.0f} ms'.format(name, statistics.median(samples)))
+    server.stop()
+
+if __name__ == "__main__":
+    main()
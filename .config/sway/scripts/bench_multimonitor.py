@@ -0,0 +1,77 @@
+#! /usr/bin/env python3
+
+# Benchmark every multimonitor action against a fake sway.
+#
+# For each fixture, runs each action in `multimonitor.ACTIONS` many times on a
+# fresh State and reports p50/p99 latency, IPC messages and bytes per action.
+# With --async, also runs each action through the asyncio mode (AioSway) and
+# reports its latency alongside. --latency-ms delays every fake reply, which is
+# where fetching state concurrently pays off.
+#
+#   ./bench_multimonitor.py [--runs N] [--async] [--latency-ms MS] [fixture ...]
+
+import argparse
+import os
+import statistics
+import time
+
+from fake_sway import FIXTURES, FakeSway
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, round(p / 100 * (len(samples) - 1)))
+    return samples[index]
+
+def time_runs(make_state, handle, action, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        handle(make_state(action), action)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def bench_fixture(name, runs, use_aio, latency_ms):
+    server = FakeSway(FIXTURES[name](), latency_secs=latency_ms / 1000).start()
+    # multimonitor connects on import, so point it at the fake first.
+    os.environ['SWAYSOCK'] = server.socket_path
+    import multimonitor
+    import swayipc
+    conn = swayipc.connect(server.socket_path)
+    aio = multimonitor.AioSway(server.socket_path) if use_aio else None
+
+    print('{} ({} outputs, {} workspaces)'.format(
+        name, len(server.fixture['outputs']), len(server.fixture['workspaces'])))
+    header = '  {:<34} {:>9} {:>9} {:>6} {:>10}'.format('action', 'p50 ms', 'p99 ms', 'msgs', 'bytes')
+    if use_aio:
+        header += ' {:>11} {:>11}'.format('async p50', 'async p99')
+    print(header)
+    for action in multimonitor.ACTIONS:
+        server.reset_counters()
+        samples = time_runs(lambda action: multimonitor.State(conn), multimonitor.handle, action, runs)
+        line = '  {:<34} {:>9.3f} {:>9.3f} {:>6.1f} {:>10.0f}'.format(
+            action,
+            statistics.median(samples),
+            percentile(samples, 99),
+            server.message_count / runs,
+            (server.bytes_sent + server.bytes_received) / runs)
+        if use_aio:
+            samples = time_runs(aio.state, multimonitor.handle, action, runs)
+            line += ' {:>11.3f} {:>11.3f}'.format(statistics.median(samples), percentile(samples, 99))
+        print(line)
+    if aio:
+        aio.close()
+    server.stop()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--async', dest='use_aio', action='store_true')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('fixtures', nargs='*', default=list(FIXTURES))
+    args = parser.parse_args()
+    for name in args.fixtures:
+        bench_fixture(name, args.runs, args.use_aio, args.latency_ms)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#! /usr/bin/env python3
+
+# Compare script startup with the built-in IPC client (swayipc) and with i3ipc.
+#
+# Reports the cumulative import time of each client (`python -X importtime`),
+# then runs multimonitor.py once per action as its own process against a fake
+# sway, the way a keybinding does, and reports the median wall-clock time.
+#
+#   ./bench_startup.py [--runs N] [fixture]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from fake_sway import FIXTURES, FakeSway
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKENDS = ['swayipc', 'i3ipc']
+
+
+def import_time_ms(module):
+    # The last line of -X importtime output is the module itself, with its cumulative time.
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        cwd=SCRIPTS_DIR, capture_output=True, text=True, check=True)
+    last = result.stderr.strip().splitlines()[-1]
+    cumulative_us = int(last.split('|')[1])
+    return cumulative_us / 1000
+
+def run_ms(env, *args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, 'multimonitor.py'), *args],
+        env=env, check=True)
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('fixture', nargs='?', default='3-outputs')
+    args = parser.parse_args()
+
+    print('import time')
+    for module in BACKENDS:
+        print('  {:<10} {:>8.1f} ms'.format(module, import_time_ms(module)))
+
+    server = FakeSway(FIXTURES[args.fixture]()).start()
+    sys.path.insert(0, SCRIPTS_DIR)
+    os.environ['SWAYSOCK'] = server.socket_path
+    import multimonitor
+
+    print('wall clock per action, one process each ({})'.format(args.fixture))
+    print('  {:<34}'.format('action') + ''.join('{:>12}'.format(b) for b in BACKENDS))
+    for action in multimonitor.ACTIONS:
+        medians = []
+        for backend in BACKENDS:
+            env = dict(os.environ, SWAYIPC=backend)
+            medians.append(statistics.median(run_ms(env, action) for _ in range(args.runs)))
+        print('  {:<34}'.format(action) + ''.join('{:>9.1f} ms'.format(m) for m in medians))
+    server.stop()
+
+if __name__ == "__main__":
+    main()
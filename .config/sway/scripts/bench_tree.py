@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+
+# Compare i3ipc's Con, swayipc's Node and swaytree's Tree on large synthetic trees.
+#
+# Each fixture's GET_TREE reply is parsed by all three, then the queries the
+# scripts make are timed on each: leaves(), workspaces(), find_focused(), the
+# workspace of every window, and whether each workspace is empty (the way
+# multimonitor.py used to check it, for Con and Node).
+#
+#   ./bench_tree.py [--runs N]
+
+import argparse
+import json
+import statistics
+import time
+
+import i3ipc
+import swayipc
+import swaytree
+from fake_sway import make_fixture
+
+# (outputs, workspaces per output, windows per workspace)
+SIZES = [(2, 10, 50), (4, 25, 50), (4, 25, 100)]
+
+
+def median_ms(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def workspace_is_empty_by_walk(tree, name):
+    for con in tree.workspaces():
+        if con.name == name and con.leaves():
+            return False
+    return True
+
+def queries(tree, names):
+    if isinstance(tree, swaytree.Tree):
+        is_empty = tree.workspace_is_empty
+    else:
+        is_empty = lambda name: workspace_is_empty_by_walk(tree, name)
+    return {
+        'leaves':       lambda: tree.leaves(),
+        'workspaces':   lambda: tree.workspaces(),
+        'find_focused': lambda: tree.find_focused(),
+        'workspace()':  lambda: [c.workspace() for c in tree.leaves()],
+        'is_empty':     lambda: [is_empty(name) for name in names],
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    parsers = {
+        'Con':  lambda data: i3ipc.Con(json.loads(data), None, None),
+        'Node': swayipc.decode,
+        'Tree': swaytree.Tree.from_json,
+    }
+    for size in SIZES:
+        fixture = make_fixture(*size)
+        data = json.dumps(fixture['tree']).encode()
+        names = [ws['name'] for ws in fixture['workspaces']]
+        trees = {name: parse(data) for name, parse in parsers.items()}
+        print('{} containers, {} workspaces, {:.1f} MB'.format(
+            len(trees['Tree']), len(names), len(data) / 1e6))
+        print('  {:<14}'.format('ms') + ''.join('{:>10}'.format(name) for name in parsers))
+        row = [median_ms(lambda: parse(data), args.runs) for parse in parsers.values()]
+        print('  {:<14}'.format('parse') + ''.join('{:>10.2f}'.format(ms) for ms in row))
+        for query in queries(trees['Tree'], names):
+            row = [median_ms(queries(tree, names)[query], args.runs) for tree in trees.values()]
+            print('  {:<14}'.format(query) + ''.join('{:>10.3f}'.format(ms) for ms in row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#! /usr/bin/env python3
+
+# A fake sway that speaks the i3-ipc protocol on a Unix socket.
+#
+# It answers GET_TREE, GET_WORKSPACES, GET_OUTPUTS and GET_VERSION from a fixture,
+# records every RUN_COMMAND it receives (replying success for each subcommand),
+# and counts messages and bytes in both directions. `emit` pushes an event to every
+# connection subscribed to it. Used by the benchmarks.
+#
+#   server = FakeSway(make_fixture(outputs=3, workspaces_per_output=10))
+#   server.start()
+#   conn = Connection(socket_path=server.socket_path)
+#   ...
+#   server.stop()
+
+import json
+import os
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+MAGIC = b'i3-ipc'
+HEADER = struct.Struct('=6sII')
+
+RUN_COMMAND     = 0
+GET_WORKSPACES  = 1
+SUBSCRIBE       = 2
+GET_OUTPUTS     = 3
+GET_TREE        = 4
+GET_VERSION     = 7
+
+EVENT_TYPES = {
+    'workspace':    0,
+    'output':       1,
+    'mode':         2,
+    'window':       3,
+    'binding':      5,
+    'shutdown':     6,
+    'tick':         7,
+}
+
+MESSAGE_NAMES = {
+    RUN_COMMAND:    'run_command',
+    GET_WORKSPACES: 'get_workspaces',
+    SUBSCRIBE:      'subscribe',
+    GET_OUTPUTS:    'get_outputs',
+    GET_TREE:       'get_tree',
+    GET_VERSION:    'get_version',
+}
+
+
+##
+# Build a consistent tree/workspaces/outputs fixture.
+#
+# Output 0 is focused; the first workspace on each output is visible, and the
+# first window on the focused workspace is focused. Workspaces are numbered
+# consecutively across outputs.
+##
+def make_fixture(outputs=3, workspaces_per_output=10, windows_per_workspace=2):
+    next_id = iter(range(1, 1_000_000))
+
+    def rect(x=0, y=0, width=1920, height=1080):
+        return {'x': x, 'y': y, 'width': width, 'height': height}
+
+    def node(type_, name, **extra):
+        n = {
+            'id': next(next_id),
+            'type': type_,
+            'name': name,
+            'rect': rect(),
+            'focused': False,
+            'focus': [],
+            'layout': 'splith',
+            'nodes': [],
+            'floating_nodes': [],
+        }
+        n.update(extra)
+        return n
+
+    tree = node('root', 'root')
+    output_list = []
+    workspace_list = []
+    num = 1
+    for i in range(outputs):
+        op_name = 'OUT-{}'.format(i + 1)
+        op = node('output', op_name, rect=rect(x=1920 * i))
+        for j in range(workspaces_per_output):
+            ws = node('workspace', str(num), num=num, output=op_name, rect=rect(x=1920 * i))
+            for k in range(windows_per_workspace):
+                app_id = 'app-{}-{}'.format(num, k)
+                ws['nodes'].append(node('con', app_id, app_id=app_id, pid=1000 + num * 10 + k,
+                    visible=(j == 0), rect=rect(x=1920 * i)))
+            ws['focus'] = [c['id'] for c in ws['nodes']]
+            if i == 0 and j == 0:
+                if ws['nodes']:
+                    ws['nodes'][0]['focused'] = True
+                else:
+                    ws['focused'] = True
+            op['nodes'].append(ws)
+            workspace_list.append({
+                'num': num,
+                'name': str(num),
+                'visible': j == 0,
+                'focused': i == 0 and j == 0,
+                'urgent': False,
+                'rect': rect(x=1920 * i),
+                'output': op_name,
+            })
+            num += 1
+        op['focus'] = [ws['id'] for ws in op['nodes']]
+        tree['nodes'].append(op)
+        output_list.append({
+            'name': op_name,
+            'make': 'Fake',
+            'model': 'Output',
+            'serial': str(i),
+            'active': True,
+            'dpms': True,
+            'primary': False,
+            'scale': 1.0,
+            'transform': 'normal',
+            'current_workspace': str(1 + i * workspaces_per_output) if workspaces_per_output else None,
+            'focused': i == 0,
+            'rect': rect(x=1920 * i),
+        })
+    tree['focus'] = [op['id'] for op in tree['nodes']]
+    return {'tree': tree, 'workspaces': workspace_list, 'outputs': output_list}
+
+FIXTURES = {
+    '1-output':     lambda: make_fixture(outputs=1, workspaces_per_output=4),
+    '3-outputs':    lambda: make_fixture(outputs=3, workspaces_per_output=8),
+    '6-outputs':    lambda: make_fixture(outputs=6, workspaces_per_output=20),
+}
+
+
+class FakeSway:
+    def __init__(self, fixture, socket_path=None, latency_secs=0):
+        # `latency_secs` delays every reply, to stand in for the compositor's own work.
+        # Like sway, requests are worked on one at a time, across all connections.
+        self.fixture = fixture
+        self.latency_secs = latency_secs
+        if socket_path is None:
+            self.tmpdir = tempfile.TemporaryDirectory(prefix='fake-sway-')
+            socket_path = os.path.join(self.tmpdir.name, 'ipc.sock')
+        self.socket_path = socket_path
+        self.commands = []
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.busy = threading.Lock()
+        self.reset_counters()
+
+    def reset_counters(self):
+        with self.lock:
+            self.message_counts = {}
+            self.bytes_received = 0
+            self.bytes_sent = 0
+
+    @property
+    def message_count(self):
+        return sum(self.message_counts.values())
+
+    def emit(self, event, payload):
+        body = json.dumps(payload).encode()
+        data = HEADER.pack(MAGIC, len(body), 0x80000000 | EVENT_TYPES[event]) + body
+        with self.lock:
+            subscribers = [sock for sock, events in self.subscribers if event in events]
+        for sock in subscribers:
+            try:
+                sock.sendall(data)
+            except OSError:
+                pass
+
+    def reply(self, msg_type, payload):
+        with self.lock:
+            name = MESSAGE_NAMES.get(msg_type, str(msg_type))
+            self.message_counts[name] = self.message_counts.get(name, 0) + 1
+        if self.latency_secs and msg_type != SUBSCRIBE:
+            with self.busy:
+                time.sleep(self.latency_secs)
+        match msg_type:
+            case 0:  # RUN_COMMAND
+                cmd = payload.decode()
+                with self.lock:
+                    self.commands.append(cmd)
+                subcmds = [c for part in cmd.split(';') for c in part.split(',') if c.strip()]
+                return [{'success': True} for _ in subcmds]
+            case 1:  # GET_WORKSPACES
+                return self.fixture['workspaces']
+            case 2:  # SUBSCRIBE
+                return {'success': True}
+            case 3:  # GET_OUTPUTS
+                return self.fixture['outputs']
+            case 4:  # GET_TREE
+                return self.fixture['tree']
+            case 7:  # GET_VERSION
+                return {'major': 1, 'minor': 9, 'patch': 0, 'human_readable': '1.9-fake',
+                        'loaded_config_file_name': ''}
+            case _:
+                return {'success': False, 'error': 'Unsupported message type'}
+
+    def start(self):
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                try:
+                    self.serve(self.request)
+                finally:
+                    with server.lock:
+                        server.subscribers = [s for s in server.subscribers if s[0] is not self.request]
+
+            def serve(self, sock):
+                while True:
+                    header = recv_exactly(sock, HEADER.size)
+                    if header is None:
+                        return
+                    magic, length, msg_type = HEADER.unpack(header)
+                    if magic != MAGIC:
+                        return
+                    payload = recv_exactly(sock, length) if length else b''
+                    if payload is None:
+                        return
+                    body = json.dumps(server.reply(msg_type, payload)).encode()
+                    data = HEADER.pack(MAGIC, len(body), msg_type) + body
+                    with server.lock:
+                        server.bytes_received += HEADER.size + length
+                        server.bytes_sent += len(data)
+                    sock.sendall(data)
+                    if msg_type == SUBSCRIBE:
+                        # Only after the reply, so no event can arrive ahead of it. Subscribing
+                        # again on the same socket adds to its events, as in sway.
+                        with server.lock:
+                            for s, events in server.subscribers:
+                                if s is sock:
+                                    events.update(json.loads(payload))
+                                    break
+                            else:
+                                server.subscribers.append((sock, set(json.loads(payload))))
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+        self.server = Server(self.socket_path, Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.unlink(self.socket_path)
+
+
+def recv_exactly(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+# Run a fake sway in the foreground, e.g. to point SWAYSOCK at it by hand.
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    name = args[0] if args else '3-outputs'
+    server = FakeSway(FIXTURES[name]()).start()
+    print(server.socket_path, flush=True)
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        print('\n'.join(server.commands))
+        server.stop()
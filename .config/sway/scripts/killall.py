@@ -1,10 +1,102 @@
 #! /usr/bin/env python3
 
-from i3ipc import Connection
-sway = Connection()
+# Close windows: ask them all to close with one chained `kill` command, wait for
+# them to go until a deadline, then SIGKILL the processes of any that are left.
+#
+#   ./killall.py [--workspace W] [--output O] [--app-id A] [--class C]
+#                [--timeout SECS] [--no-force]
+#
+# Filters can be repeated, and windows must pass every filter given. Without
+# filters, every window is closed.
 
-# Kill all windows
-if __name__ == "__main__":
-    for c in sway.get_tree().leaves():
-        sway.command('[con_id="{}"] kill'.format(c.id))
+import argparse
+import os
+import signal
+import time
+import swayipc
+import swaytrace
+from swayipc import Event
+sway = swayipc.connect()
+
+# How long to wait for windows to go after SIGKILL.
+FORCED_WAIT_SECS = 1
+
+
+def select_windows(tree, workspaces=(), outputs=(), app_ids=(), classes=()):
+    # Walks outputs and their workspaces, rather than calling workspace() per window.
+    selected = []
+    for op in tree.nodes:
+        if outputs and op.name not in outputs:
+            continue
+        for ws in op.nodes:
+            if ws.type != 'workspace' or (workspaces and ws.name not in workspaces):
+                continue
+            for c in ws.leaves():
+                props = c.ipc_data.get('window_properties') or {}
+                if app_ids and c.ipc_data.get('app_id') not in app_ids:
+                    continue
+                if classes and props.get('class') not in classes:
+                    continue
+                selected.append(c)
+    return selected
+
+def killall(tree, windows, timeout_secs, force=True):
+    open_ids = {c.id for c in windows}
+
+    def close_callback(self, e):
+        open_ids.discard(e.container.id)
+        if not open_ids:
+            sway.main_quit()
+
+    # Listen before killing, so no close event is missed.
+    sway.on(Event.WINDOW_CLOSE, close_callback)
 
+    start = time.monotonic()
+    if windows:
+        sway.command('; '.join('[con_id="{}"] kill'.format(c.id) for c in windows))
+        sway.main(timeout=timeout_secs)
+    print('graceful: {} of {} windows closed in {:.2f}s'.format(
+        len(windows) - len(open_ids), len(windows), time.monotonic() - start))
+
+    if open_ids and force:
+        # Only kill processes all of whose windows were selected, so that closing one
+        # browser window doesn't take the others with it.
+        selected_pids = {c.ipc_data.get('pid') for c in windows}
+        other_pids = {c.ipc_data.get('pid') for c in tree.leaves()} - selected_pids
+        pids = ({c.ipc_data.get('pid') for c in windows if c.id in open_ids}
+                - other_pids - {None, 0, os.getpid()})
+        start = time.monotonic()
+        before = len(open_ids)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        if pids:
+            sway.main(timeout=FORCED_WAIT_SECS)
+        print('forced: {} processes killed, {} of {} windows closed in {:.2f}s'.format(
+            len(pids), before - len(open_ids), before, time.monotonic() - start))
+
+    sway.off(close_callback)
+    if open_ids:
+        print('{} windows still open'.format(len(open_ids)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workspace', dest='workspaces', action='append', default=[])
+    parser.add_argument('--output', dest='outputs', action='append', default=[])
+    parser.add_argument('--app-id', dest='app_ids', action='append', default=[])
+    parser.add_argument('--class', dest='classes', action='append', default=[])
+    parser.add_argument('--timeout', type=float, default=5,
+        help='seconds to wait for windows to close before killing their processes')
+    parser.add_argument('--no-force', dest='force', action='store_false',
+        help="don't kill the processes of windows that didn't close")
+    args = parser.parse_args()
+
+    with swaytrace.action('killall'):
+        tree = sway.get_tree()
+        windows = select_windows(tree, args.workspaces, args.outputs, args.app_ids, args.classes)
+        killall(tree, windows, args.timeout, args.force)
+
+if __name__ == "__main__":
+    main()
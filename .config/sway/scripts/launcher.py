@@ -1,15 +1,37 @@
 #! /usr/bin/env python3
 
+import argparse
+import json
+import os
+import shlex
 import socket
-from typing import Callable
-from i3ipc import Connection, Event
+import subprocess
+import time
+import swayipc
+import swaytrace
+from swayipc import Event
+from swaymatch import Matcher, MatcherIndex, window_keys
 
-sway = Connection()
+# Connected by connect(), so that --stats works outside sway.
+sway = None
+
+# Launch timeouts come from each program's recorded spawn-to-window times, once it has
+# HISTORY_MIN_SAMPLES of them: TIMEOUT_MARGIN times their TIMEOUT_PERCENTILE, capped. If
+# the last launch timed out, that's raised by one more TIMEOUT_MARGIN.
+HISTORY_PATH = os.path.join(
+    os.environ.get('XDG_STATE_HOME', os.path.expanduser('~/.local/state')),
+    'sway-launcher-history.json')
+HISTORY_SAMPLES = 50
+HISTORY_MIN_SAMPLES = 5
+TIMEOUT_PERCENTILE = 95
+TIMEOUT_MARGIN = 1.5
+TIMEOUT_MIN_SECS = 1
+TIMEOUT_MAX_SECS = 30
 
 class Program:
-    def __init__(self, name:str, cmd:str, workspace:str, matcher:Callable,
+    def __init__(self, name:str, cmd:str, workspace:str, matcher:Matcher,
             enabled:bool=True, do_relaunch:bool=False, timeout_secs:float=5,
-            post_swaycmd:str=None):
+            post_swaycmd:str=None, after:list=None):
         self.name           = name
         self.cmd            = cmd
         self.workspace      = workspace
@@ -18,6 +40,19 @@ class Program:
         self.do_relaunch    = do_relaunch
         self.timeout_secs   = timeout_secs
         self.post_swaycmd   = post_swaycmd
+        # Names of programs whose windows this one's post_swaycmd expects to be there.
+        self.after          = after or []
+
+
+class LaunchResult:
+    # How a program's launch went: 'launched' after `secs`, 'timed out' after `secs`, or
+    # 'skipped' because it was already running. `note` says what went differently than
+    # planned, if anything.
+    def __init__(self, name:str, status:str, secs:float=None, note:str=None):
+        self.name           = name
+        self.status         = status
+        self.secs           = secs
+        self.note           = note
 
 
 def programs_to_launch():
@@ -38,6 +73,7 @@ def programs_to_launch():
                     cmd             = 'glava',
                     matcher         = match_by_window_props('GLava', 'GLava'),
                     post_swaycmd    = 'move up, resize set height 200px, focus next',
+                    after           = ['youtube_music'],
                 ),
                 Program(
                     name            = 'term_stui',
@@ -51,6 +87,7 @@ def programs_to_launch():
                     cmd             = 'alacritty --class term_htop --command htop',
                     matcher         = match_by_app_id('term_htop'),
                     post_swaycmd    = 'focus',
+                    after           = ['term_stui'],
                 ),
                 Program(
                     name            = 'discord',
@@ -80,6 +117,7 @@ def programs_to_launch():
                                         '"--app-id=kjbdgfilnfhdoflbpgamdcdgpehopbep"',
                     matcher         = match_chrome_app('kjbdgfilnfhdoflbpgamdcdgpehopbep'),
                     post_swaycmd    = 'move left, resize set width 40ppt, focus next',
+                    after           = ['mail'],
                 ),
             ]
             
@@ -100,6 +138,7 @@ def programs_to_launch():
                     matcher         = match_by_app_id('term_cava'),
                     post_swaycmd    = 'move up, resize set height 200px, focus next',
                     enabled         = False,
+                    after           = ['youtube_music'],
                 ),
                 Program(
                     name            = 'term_stui',
@@ -115,6 +154,7 @@ def programs_to_launch():
                     matcher         = match_by_app_id('term_htop'),
                     post_swaycmd    = 'focus',
                     enabled         = False,
+                    after           = ['term_stui'],
                 ),
                 Program(
                     name            = 'term_work',
@@ -144,6 +184,7 @@ def programs_to_launch():
                                         '"--app-id=fmgjjmmmlfnkbppncabfkddbjimcfncm"',
                     matcher         = match_chrome_app('fmgjjmmmlfnkbppncabfkddbjimcfncm'),
                     post_swaycmd    = 'resize set width 75ppt',
+                    after           = ['calendar'],
                 ),
             ]
 
@@ -152,19 +193,10 @@ def programs_to_launch():
 
 
 def match_by_app_id(app_id:str):
-    def matcher(c):
-        return c.app_id == app_id
-    return matcher
+    return Matcher(app_id=app_id)
 
 def match_by_window_props(window_class:str, window_instance:str):
-    def matcher(c):
-        return (
-            'window_properties' in c.ipc_data and
-            'class' in c.ipc_data['window_properties'] and
-            'instance' in c.ipc_data['window_properties'] and
-            c.ipc_data['window_properties']['class'] == window_class and
-            c.ipc_data['window_properties']['instance'] == window_instance )
-    return matcher
+    return Matcher(window_class=window_class, window_instance=window_instance)
 
 def match_chrome_app(chrome_app_id:str):
     return match_by_window_props('Google-chrome', 'crx_' + chrome_app_id)
@@ -172,9 +204,8 @@ def match_chrome_app(chrome_app_id:str):
 def match_discord():
     # Need another condition to match Discord, because the startup icon
     # has the same window properties as the main discord window.
-    def matcher(c):
-        return match_by_window_props('discord', 'discord') and c.geometry.height > 350
-    return matcher
+    return Matcher(window_class='discord', window_instance='discord',
+        geometry=lambda g: g.height > 350)
 
 def sway_exec(command:str):
     sway.command('exec {}'.format(command))
@@ -187,35 +218,359 @@ def sway_container_cmd(con_id:int, swaycmd:str):
     sway.command('[con_id="{}"] {}'.format(
         con_id, swaycmd))
 
-def sway_already_launched(matcher:Callable, workspace:str):
-    for c in sway.get_tree().leaves():
-        if c.workspace().name == workspace and matcher(c):
-            return True
-    return False
+def sway_spawn_with_rule(p:Program):
+    # Spawn `p` ourselves, to learn its pid, and have sway move that process's windows to the
+    # workspace as they map, so they don't show up on the current one first. Sway can't remove
+    # for_window rules, so the rule is scoped to the pid and goes inert when the process exits.
+    # The rule can only be added once the process is running, so a quick window may map before
+    # it; the caller still moves the window it claims. Returns the pid; raises OSError if the
+    # command can't be run.
+    proc = subprocess.Popen(shlex.split(p.cmd), start_new_session=True,
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    sway.command('for_window [pid={} {}] move container to workspace {}'.format(
+        proc.pid, p.matcher.criteria(), p.workspace))
+    return proc.pid
+
+def open_windows(tree):
+    # Index every window in `tree` by (workspace, key) in one pass, for `sway_already_launched`.
+    # Windows are filed under each key a Matcher could have, and under None for matchers with none.
+    windows = {}
+    for ws in tree.workspaces():
+        for c in ws.leaves():
+            for key in window_keys(c) + [None]:
+                windows.setdefault((ws.name, key), []).append(c)
+    return windows
+
+def sway_already_launched(matcher:Matcher, workspace:str, windows:dict):
+    return any(matcher(c) for c in windows.get((workspace, matcher.key()), ()))
+
+class NewWindows:
+    # Windows mapped since a launch started, until claimed or closed. They're matched when they
+    # map and again on every later event about them (title, property or geometry changes), so
+    # a window that only gets its final class, title or size after mapping is claimed as soon
+    # as it does, instead of the launch waiting out its timeout.
+    def __init__(self):
+        self.ids = set()
+
+    def candidate(self, e):
+        # The event's window, if it's one to match.
+        c = e.container
+        match e.change:
+            case 'new':
+                self.ids.add(c.id)
+            case 'close':
+                self.ids.discard(c.id)
+                return None
+        return c if c.id in self.ids else None
+
+    def claim(self, c):
+        self.ids.discard(c.id)
+
+def launch(p:Program, windows:dict):
+    if not p.do_relaunch and sway_already_launched(p.matcher, p.workspace, windows):
+        return LaunchResult(p.name, 'skipped')
 
-def launch(p:Program):
-    if not p.do_relaunch and sway_already_launched(p.matcher, p.workspace):
-        return
+    start = time.monotonic()
+    result = LaunchResult(p.name, 'timed out', p.timeout_secs)
+    new_windows = NewWindows()
 
-    def new_window_callback(self, e):
-        if e.change == 'new' and p.matcher(e.container):
-            sway_move(e.container.id, p.workspace)
+    def window_callback(self, e):
+        c = new_windows.candidate(e)
+        if c and result.status != 'launched' and p.matcher(c):
+            new_windows.claim(c)
+            result.status, result.secs = 'launched', time.monotonic() - start
+            sway_move(c.id, p.workspace)
             if p.post_swaycmd:
-                sway_container_cmd(e.container.id, p.post_swaycmd)
+                sway_container_cmd(c.id, p.post_swaycmd)
             sway.main_quit()
 
-    sway.on(Event.WINDOW_NEW, new_window_callback)
+    sway.on(Event.WINDOW, window_callback)
     sway_exec(p.cmd)
     sway.main(timeout=p.timeout_secs)
-    sway.off(new_window_callback)
+    sway.off(window_callback)
+    return result
+
+def launch_parallel(programs:list, windows:dict, rules:bool=False):
+    # Spawn each program as soon as the programs it's `after` are done (launched, timed out or
+    # skipped), with one window handler that hands each new window to the first waiting
+    # program it matches (see NewWindows). Each program's timeout runs from its own spawn.
+    # With `rules`, programs whose matchers can be written as criteria are placed by sway
+    # as their windows map (see sway_spawn_with_rule).
+    names = {p.name for p in programs}
+    results = {}
+    blocked = []
+    waiting = MatcherIndex()
+    starts = {}
+    notes = {}
+    for p in programs:
+        if not p.do_relaunch and sway_already_launched(p.matcher, p.workspace, windows):
+            results[p.name] = LaunchResult(p.name, 'skipped')
+        else:
+            blocked.append(p)
+
+    def spawn_ready():
+        # Dependencies that aren't part of this run (disabled programs) don't hold anything back.
+        for p in list(blocked):
+            if all(dep in results or dep not in names for dep in p.after):
+                blocked.remove(p)
+                waiting.add(p.matcher, p)
+                starts[p.name] = time.monotonic()
+                if rules and p.matcher.criteria() is not None:
+                    try:
+                        sway_spawn_with_rule(p)
+                    except OSError as e:
+                        # Sway runs the command through sh, which may still manage it
+                        # (shell syntax, say); the window is then moved after it maps.
+                        notes[p.name] = 'no rule, spawning failed: {}'.format(e)
+                        sway_exec(p.cmd)
+                else:
+                    sway_exec(p.cmd)
+
+    def deadline(p):
+        return starts[p.name] + p.timeout_secs
+
+    new_windows = NewWindows()
+
+    def window_callback(self, e):
+        c = new_windows.candidate(e)
+        if not c:
+            return
+        now = time.monotonic()
+        for p in waiting.lookup(c):
+            if now <= deadline(p):
+                new_windows.claim(c)
+                waiting.discard(p)
+                results[p.name] = LaunchResult(p.name, 'launched', now - starts[p.name], notes.get(p.name))
+                # Even with a rule: the window may have mapped before the rule was added, or
+                # belong to another process (say, an already running browser). If the rule
+                # did place it, the move does nothing.
+                sway_move(c.id, p.workspace)
+                if p.post_swaycmd:
+                    sway_container_cmd(c.id, p.post_swaycmd)
+                # Return to the loop below, to spawn whatever was waiting on this one.
+                sway.main_quit()
+                break
+
+    sway.on(Event.WINDOW, window_callback)
+    spawn_ready()
+    while waiting:
+        # main(timeout=0) means no timeout, so never pass it an expired deadline.
+        sway.main(timeout=max(0.001, min(deadline(p) for p in waiting) - time.monotonic()))
+        now = time.monotonic()
+        for p in waiting:
+            if now > deadline(p):
+                waiting.discard(p)
+                results[p.name] = LaunchResult(p.name, 'timed out', p.timeout_secs, notes.get(p.name))
+        spawn_ready()
+    sway.off(window_callback)
+    return [results[p.name] for p in programs]
+
+def check_after(programs:list):
+    # Programs may only be `after` programs listed before them. That keeps the sequential
+    # launch order valid, and rules out cycles and misspelled names.
+    seen = set()
+    for p in programs:
+        for dep in p.after:
+            if dep not in seen:
+                raise RuntimeError('{} is after {}, which is not listed before it.'.format(p.name, dep))
+        seen.add(p.name)
+
+def print_summary(results:list):
+    for r in results:
+        match r.status:
+            case 'launched':
+                print('{:<16} {:.2f}s'.format(r.name, r.secs))
+            case 'skipped':
+                print('{:<16} skipped, already running'.format(r.name))
+            case _:
+                print('{:<16} {}'.format(r.name, r.status))
+        if r.note:
+            print('{:<16} ({})'.format('', r.note))
+    counts = {}
+    for r in results:
+        counts[r.status] = counts.get(r.status, 0) + 1
+    print(', '.join('{} {}'.format(n, status) for status, n in counts.items()))
+
 
+async def launch_async(conn, p:Program, windows:dict, claimed:set):
+    # Same as `launch`, awaiting the window (or the timeout) instead of running a blocking loop.
+    # Launches run side by side, so a window claimed by one (its id is in `claimed`) is left
+    # alone by the others. asyncio is imported here rather than at the top, so the other
+    # modes don't pay for it.
+    import asyncio
+    if not p.do_relaunch and sway_already_launched(p.matcher, p.workspace, windows):
+        return LaunchResult(p.name, 'skipped')
 
-def main():
+    start = time.monotonic()
+    window = asyncio.get_running_loop().create_future()
+    new_windows = NewWindows()
+
+    def window_callback(conn, e):
+        c = new_windows.candidate(e)
+        if c and not window.done() and c.id not in claimed and p.matcher(c):
+            new_windows.claim(c)
+            claimed.add(c.id)
+            window.set_result(c)
+
+    conn.on(Event.WINDOW, window_callback)
+    try:
+        await conn.command('exec {}'.format(p.cmd))
+        c = await asyncio.wait_for(window, p.timeout_secs)
+    except asyncio.TimeoutError:
+        return LaunchResult(p.name, 'timed out', p.timeout_secs)
+    finally:
+        conn.off(window_callback)
+    secs = time.monotonic() - start
+    await conn.command('[con_id="{}"] move container to workspace {}'.format(c.id, p.workspace))
+    if p.post_swaycmd:
+        await conn.command('[con_id="{}"] {}'.format(c.id, p.post_swaycmd))
+    return LaunchResult(p.name, 'launched', secs)
+
+async def launch_all_async(conn, programs:list, windows:dict):
+    # Run every launch at once, except that a program waits for the programs it's `after`
+    # (launched, timed out or skipped) before spawning, as in `launch_parallel`.
+    import asyncio
+    names = {p.name for p in programs}
+    tasks = {}
+    claimed = set()
+
+    async def run(p):
+        # check_after guarantees the tasks of everything `p` is after already exist.
+        deps = [tasks[dep] for dep in p.after if dep in names]
+        if deps:
+            await asyncio.gather(*deps)
+        return await launch_async(conn, p, windows, claimed)
+
+    for p in programs:
+        tasks[p.name] = asyncio.ensure_future(run(p))
+    return list(await asyncio.gather(*tasks.values()))
+
+
+##
+# Timeout history
+##
+
+def percentile(samples:list, p:float):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, round(p / 100 * (len(samples) - 1)))
+    return samples[index]
+
+def load_history():
+    # {hostname: {program name: [sample, ...]}}, oldest first. A sample is the seconds to the
+    # window, or {"timed_out": seconds} for a launch that gave up.
+    try:
+        with open(HISTORY_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def timed_out(sample):
+    return isinstance(sample, dict)
+
+def save_history(history:dict, results:list):
+    host = history.setdefault(socket.gethostname(), {})
+    for r in results:
+        if r.secs is not None:
+            samples = host.setdefault(r.name, [])
+            secs = round(r.secs, 3)
+            samples.append({'timed_out': secs} if r.status == 'timed out' else secs)
+            del samples[:-HISTORY_SAMPLES]
+    os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+    with open(HISTORY_PATH + '.tmp', 'w') as f:
+        json.dump(history, f)
+    os.replace(HISTORY_PATH + '.tmp', HISTORY_PATH)
+
+def learned_timeout(samples:list):
+    # Only windows that did appear count toward the percentile, so a program that never
+    # shows a window (uninstalled, crashing) keeps its default timeout instead of creeping
+    # up to the cap. A timeout that was too short grows one step, and stays there until
+    # the launches that make it seem normal are recorded.
+    launched = [s for s in samples if not timed_out(s)]
+    if len(launched) < HISTORY_MIN_SAMPLES:
+        return None
+    secs = percentile(launched, TIMEOUT_PERCENTILE) * TIMEOUT_MARGIN
+    if timed_out(samples[-1]):
+        secs *= TIMEOUT_MARGIN
+    return min(TIMEOUT_MAX_SECS, max(TIMEOUT_MIN_SECS, secs))
+
+def apply_history(programs:list, history:dict):
+    host = history.get(socket.gethostname(), {})
+    for p in programs:
+        timeout_secs = learned_timeout(host.get(p.name, []))
+        if timeout_secs is not None:
+            p.timeout_secs = timeout_secs
+
+def print_stats(history:dict):
+    host = history.get(socket.gethostname(), {})
+    print('{:<16} {:>5} {:>8} {:>7} {:>7} {:>7} {:>9} {:>9}'.format(
+        'program', 'runs', 'timeouts', 'p50', 'p95', 'max', 'last 5', 'timeout'))
     for p in programs_to_launch():
-        if p.enabled:
-            launch(p)
+        samples = host.get(p.name, [])
+        launched = [s for s in samples if not timed_out(s)]
+        timeouts = len(samples) - len(launched)
+        if not launched:
+            print('{:<16} {:>5} {:>8}'.format(p.name, len(samples), timeouts))
+            continue
+        timeout_secs = learned_timeout(samples)
+        print('{:<16} {:>5} {:>8} {:>6.2f}s {:>6.2f}s {:>6.2f}s {:>8.2f}s {:>8.2f}s{}'.format(
+            p.name, len(samples), timeouts, percentile(launched, 50), percentile(launched, 95),
+            max(launched), percentile(launched[-5:], 50),
+            timeout_secs if timeout_secs is not None else p.timeout_secs,
+            '' if timeout_secs is not None else ' (default)'))
 
-if __name__ == "__main__":
-    main()
 
+def connect(socket_path=None):
+    global sway
+    sway = swayipc.connect(socket_path)
+    return sway
+
+def main(parallel:bool=False, rules:bool=False):
+    connect()
+    check_after(programs_to_launch())
+    programs = [p for p in programs_to_launch() if p.enabled]
+    history = load_history()
+    apply_history(programs, history)
+    windows = open_windows(sway.get_tree())
+    if parallel or rules:
+        with swaytrace.action('launch_parallel'):
+            results = launch_parallel(programs, windows, rules)
+    else:
+        results = []
+        for p in programs:
+            with swaytrace.action('launch ' + p.name):
+                results.append(launch(p, windows))
+    print_summary(results)
+    save_history(history, results)
 
+async def main_async():
+    import swayipc_aio
+    conn = await swayipc_aio.connect_async()
+    await conn.subscribe([Event.WINDOW])
+    check_after(programs_to_launch())
+    programs = [p for p in programs_to_launch() if p.enabled]
+    history = load_history()
+    apply_history(programs, history)
+    windows = open_windows(await conn.get_tree())
+    with swaytrace.action('launch_all_async'):
+        results = await launch_all_async(conn, programs, windows)
+    print_summary(results)
+    save_history(history, results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--async', dest='use_aio', action='store_true',
+        help='launch everything at once with the asyncio client (respecting `after`)')
+    parser.add_argument('--parallel', action='store_true',
+        help='spawn each program as soon as the programs it is after have their windows')
+    parser.add_argument('--rules', action='store_true',
+        help='like --parallel, but have sway place windows as they map with for_window rules')
+    parser.add_argument('--stats', action='store_true',
+        help='show recorded spawn-to-window times and the timeouts learned from them')
+    args = parser.parse_args()
+    if args.stats:
+        print_stats(load_history())
+    elif args.use_aio:
+        import asyncio
+        asyncio.run(main_async())
+    else:
+        main(args.parallel, args.rules)
@@ -1,201 +1,535 @@
 #! /usr/bin/env python3
 
+import argparse
+import os
+import queue
+import signal
 import sys
+import threading
+import time
+import traceback
 import types
-from i3ipc import Connection
-sway = Connection()
-
-def current_container():
-    return sway.get_tree().find_focused()
-
-def current_workspace():
-    return sway.get_tree().find_focused().workspace()
-
-def current_output():
-    for op in sway.get_outputs():
-        if op.focused:
-            return op
-
-def next_output():
-    outputs = sway.get_outputs()
-    current_index = [op.focused for op in outputs].index(True)
-    next_index = (current_index + 1) % len(outputs)
-    return outputs[next_index]
-    
-def prev_output():
-    outputs = sway.get_outputs()
-    current_index = [op.focused for op in outputs].index(True)
-    prev_index = (current_index - 1) % len(outputs)
-    return outputs[prev_index]
-
-def workspaces_on_output(op):
-    workspaces = []
-    for ws in sway.get_workspaces():
-        if ws.output == op.name:
-            workspaces.append(ws)
-    return workspaces
-
-def current_workspace_on_output(op):
-    workspaces = workspaces_on_output(op)
+from bisect import bisect_left
+from functools import cached_property
+import swayipc
+import swaytrace
+import swaytree
+from swayipc import Event
+sway = swayipc.connect()
+
+# Bindings of the form `bindsym <keys> nop multimonitor <action>` are picked up by the daemon.
+BINDING_PREFIX = 'nop multimonitor '
+
+# Cycle actions the daemon can merge: action -> (kind, steps).
+CYCLE_ACTIONS = {
+    'focus_next_workspace': ('workspace', 1),
+    'focus_prev_workspace': ('workspace', -1),
+    'focus_next_output':    ('output', 1),
+    'focus_prev_output':    ('output', -1),
+}
+
+# Workspace numbers reserved for particular outputs, used when opening a new workspace there.
+# For example: {'DP-3': range(11, 21)}
+OUTPUT_WORKSPACE_RANGES = {}
+
+# Every action understood by `handle`.
+ACTIONS = [
+    'focus_next_output',
+    'focus_prev_output',
+    'focus_next_workspace',
+    'focus_prev_workspace',
+    'focus_new_workspace',
+    'move_container_to_new_workspace',
+    'move_container_to_next_output',
+    'move_container_to_prev_output',
+    'move_workspace_to_next_output',
+    'move_workspace_to_prev_output',
+    'cycle_outputs_next',
+    'cycle_outputs_prev',
+]
+
+# Actions that need the tree (for the focused container), not just outputs and workspaces.
+TREE_ACTIONS = {
+    'move_container_to_new_workspace',
+    'move_container_to_next_output',
+    'move_container_to_prev_output',
+}
+
+class State:
+    # A snapshot of sway's outputs, workspaces and tree for the duration of one action.
+    # Each is requested lazily and at most once; commands and requests are counted in `ipc_count`.
+    def __init__(self, conn):
+        self.conn = conn
+        self.ipc_count = 0
+
+    def request(self, fn, *args):
+        self.ipc_count += 1
+        return fn(*args)
+
+    def seed(self, **values):
+        # Fill in values fetched elsewhere (see AioSway) as if they had been requested.
+        self.__dict__.update(values)
+        self.ipc_count += len(values)
+
+    def command(self, cmd):
+        return self.request(self.conn.command, cmd)
+
+    @cached_property
+    def outputs(self):
+        return self.request(self.conn.get_outputs)
+
+    @cached_property
+    def workspaces(self):
+        return self.request(self.conn.get_workspaces)
+
+    @cached_property
+    def tree(self):
+        return self.request(swaytree.get_tree, self.conn)
+
+    @cached_property
+    def workspaces_by_output(self):
+        index = {}
+        for ws in self.workspaces:
+            index.setdefault(ws.output, []).append(ws)
+        return index
+
+    @cached_property
+    def workspace_numbers(self):
+        return WorkspaceNumbers(self.workspaces)
+
+    @cached_property
+    def focused_output_index(self):
+        return [op.focused for op in self.outputs].index(True)
+
+    @cached_property
+    def focused_output(self):
+        return self.outputs[self.focused_output_index]
+
+    @cached_property
+    def focused_workspace(self):
+        for ws in self.workspaces:
+            if ws.focused:
+                return ws
+
+    @cached_property
+    def focused_container(self):
+        return self.tree.find_focused()
+
+class WorkspaceNumbers:
+    # Sorted index of the workspace numbers in use on all outputs.
+    def __init__(self, workspaces):
+        # Several workspaces can share a number (`1` and `1:web`), so deduplicate.
+        self.used = sorted({ws.num for ws in workspaces if ws.num >= 0})
+
+    def first_free(self, start, stop=None):
+        # Smallest unused number >= start (and < stop, if given), or None.
+        i = bisect_left(self.used, start)
+        if i == len(self.used) or self.used[i] != start:
+            n = start
+        else:
+            # used[i:j+1] is a run of consecutive numbers starting at `start`;
+            # binary search for the end of it.
+            lo, hi = i, len(self.used) - 1
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if self.used[mid] - self.used[i] == mid - i:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            n = self.used[lo] + 1
+        if stop is not None and n >= stop:
+            return None
+        return n
+
+class CommandBatch:
+    # Collects sway commands and submits them in a single IPC message.
+    # Each `add` is one step of comma-separated subcommands; steps are chained with `;`.
+    def __init__(self):
+        self.steps = []
+
+    def add(self, *subcmds):
+        self.steps.append(subcmds)
+
+    def submit(self, state):
+        # Returns (subcommand, success, error) for every subcommand, in order.
+        if not self.steps:
+            return []
+        subcmds = [cmd for step in self.steps for cmd in step]
+        replies = state.command('; '.join(', '.join(step) for step in self.steps))
+        results = []
+        for cmd, reply in zip(subcmds, replies):
+            results.append((cmd, reply.success, reply.error))
+            if not reply.success:
+                print('{}: {}'.format(cmd, reply.error), file=sys.stderr)
+        return results
+
+def current_container(state):
+    return state.focused_container
+
+def current_workspace(state):
+    return state.focused_workspace
+
+def current_output(state):
+    return state.focused_output
+
+def output_after(state, steps):
+    index = (state.focused_output_index + steps) % len(state.outputs)
+    return state.outputs[index]
+
+def next_output(state):
+    return output_after(state, 1)
+
+def prev_output(state):
+    return output_after(state, -1)
+
+def workspaces_on_output(state, op):
+    return state.workspaces_by_output.get(op.name, [])
+
+def current_workspace_on_output(state, op):
+    workspaces = workspaces_on_output(state, op)
     current_index = [ws.visible for ws in workspaces].index(True)
     return workspaces[current_index]
 
-def next_workspace_on_output(op):
-    workspaces = workspaces_on_output(op)
+def workspace_on_output_after(state, op, steps):
+    workspaces = workspaces_on_output(state, op)
     current_index = [ws.visible for ws in workspaces].index(True)
-    next_index = (current_index + 1) % len(workspaces)
-    return workspaces[next_index]
+    index = (current_index + steps) % len(workspaces)
+    return workspaces[index]
 
-def prev_workspace_on_output(op):
-    workspaces = workspaces_on_output(op)
-    current_index = [ws.visible for ws in workspaces].index(True)
-    prev_index = (current_index - 1) % len(workspaces)
-    return workspaces[prev_index]
+def next_workspace_on_output(state, op):
+    return workspace_on_output_after(state, op, 1)
+
+def prev_workspace_on_output(state, op):
+    return workspace_on_output_after(state, op, -1)
 
-def output_of_workspace(ws):
-    for op in sway.get_outputs():
+def output_of_workspace(state, ws):
+    for op in state.outputs:
         if op.name == ws.ipc_data['output']:
             return op
 
-def new_workspace(op):
+def new_workspace(state, op):
     # Get the next unused workspace number on this output.
-    # The "next" number is the smallest unused workspace number after the smallest used workspace number on this output.
-    used_nums_on_output = [ws.num for ws in sway.get_workspaces() if ws.output == op.name]
-    n = min(used_nums_on_output)
-    while n in used_nums_on_output:
-        n += 1
+    # If the output owns a range in OUTPUT_WORKSPACE_RANGES, that's the smallest number in the
+    # range not used on any output. Otherwise, it's the smallest number not used on any output,
+    # after the smallest used workspace number on this output.
+    numbers = state.workspace_numbers
+    n = None
+    if op.name in OUTPUT_WORKSPACE_RANGES:
+        r = OUTPUT_WORKSPACE_RANGES[op.name]
+        n = numbers.first_free(r.start, r.stop)
+    if n is None:
+        used_nums_on_output = [ws.num for ws in workspaces_on_output(state, op) if ws.num >= 0]
+        n = numbers.first_free(min(used_nums_on_output, default=1))
     ws = types.SimpleNamespace()
     ws.num = n
     ws.name = str(n)
     return ws
 
-def workspace_is_empty(ws):
-    for con in sway.get_tree().workspaces():
-        if con.name == ws.name and con.leaves():
-            return False
-    return True
+def workspace_is_empty(state, ws):
+    return state.tree.workspace_is_empty(ws.name)
 
-def focus_container(c):
-    sway.command('[con_id="{}"] focus'.format(c.id))
+def focus_container(state, c):
+    state.command('[con_id="{}"] focus'.format(c.id))
 
-def focus_workspace(ws):
-    sway.command('workspace number {}'.format(ws.num))
+def focus_workspace(state, ws):
+    state.command('workspace number {}'.format(ws.num))
 
-def focus_output(op):
-    focus_workspace(current_workspace_on_output(op))
+def focus_output(state, op):
+    focus_workspace(state, current_workspace_on_output(state, op))
 
-def move_container_to_workspace(c, ws):
-    sway.command('[con_id="{}"] move container to workspace number {}'.format(c.id, ws.num))
+def move_container_to_workspace(state, c, ws):
+    state.command('[con_id="{}"] move container to workspace number {}'.format(c.id, ws.num))
 
-def move_workspace_to_output(ws, op):
+def move_workspace_to_output(state, ws, op):
     # No way to do this on an empty workspace without focusing on it.
-    initial_ws = current_workspace()
-    sway.command('workspace "{}", move workspace to output {}'.format(ws.name, op.name))
-    focus_workspace(initial_ws)
+    initial_ws = current_workspace(state)
+    state.command('workspace "{}", move workspace to output {}'.format(ws.name, op.name))
+    focus_workspace(state, initial_ws)
 
-def move_workspace_to_output_and_focus(ws, op):
-    sway.command('workspace "{}", move workspace to output {}'.format(ws.name, op.name))
+def move_workspace_to_output_and_focus(state, ws, op):
+    state.command('workspace "{}", move workspace to output {}'.format(ws.name, op.name))
 
-def move_container_to_output(c, op):
-    move_container_to_workspace(c, current_workspace_on_output(op))
+def move_container_to_output(state, c, op):
+    move_container_to_workspace(state, c, current_workspace_on_output(state, op))
 
-def move_focused_container_to_workspace(ws):
-    move_container_to_workspace(current_container(), ws)
+def move_focused_container_to_workspace(state, ws):
+    move_container_to_workspace(state, current_container(state), ws)
 
-def move_focused_workspace_to_output(op):
-    move_workspace_to_output(current_workspace(), op)
+def move_focused_workspace_to_output(state, op):
+    move_workspace_to_output(state, current_workspace(state), op)
 
-def move_focused_container_to_output(op):
-    move_container_to_output(current_container(), op)
+def move_focused_container_to_output(state, op):
+    move_container_to_output(state, current_container(state), op)
 
-def cycle_outputs_next():
-    outputs = sway.get_outputs()
+def cycle_outputs(state, step):
+    # Move every output's workspaces to the output `step` places along, then restore focus,
+    # all in one chained command.
+    outputs = state.outputs
     new_assignments = {}
-    starting_ws = current_workspace()
+    starting_ws = current_workspace(state)
     for i in range(len(outputs)):
-        next_op = outputs[(i + 1) % len(outputs)]
-        new_assignments[next_op] = workspaces_on_output(outputs[i])
+        new_op = outputs[(i + step) % len(outputs)]
+        new_assignments[new_op] = workspaces_on_output(state, outputs[i])
+    batch = CommandBatch()
     for op, workspaces in new_assignments.items():
         for ws in workspaces:
-            move_workspace_to_output_and_focus(ws, op)
-    focus_workspace(starting_ws)
+            batch.add('workspace "{}"'.format(ws.name), 'move workspace to output {}'.format(op.name))
+    batch.add('workspace number {}'.format(starting_ws.num))
+    return batch.submit(state)
 
-def cycle_outputs_prev():
-    outputs = sway.get_outputs()
-    new_assignments = {}
-    starting_ws = current_workspace()
-    for i in range(len(outputs)):
-        prev_op = outputs[(i - 1) % len(outputs)]
-        new_assignments[prev_op] = workspaces_on_output(outputs[i])
-    for op, workspaces in new_assignments.items():
-        for ws in workspaces:
-            move_workspace_to_output(ws, op)
-    focus_workspace(starting_ws)
+def cycle_outputs_next(state):
+    return cycle_outputs(state, 1)
+
+def cycle_outputs_prev(state):
+    return cycle_outputs(state, -1)
 
-def handle(arg):
+def handle(state, arg):
     match arg:
         case "focus_next_output":
-            focus_output(next_output())
+            focus_output(state, next_output(state))
 
         case "focus_prev_output":
-            focus_output(prev_output())
+            focus_output(state, prev_output(state))
 
         case "focus_next_workspace":
-            focus_workspace(next_workspace_on_output(current_output()))
+            focus_workspace(state, next_workspace_on_output(state, current_output(state)))
 
         case "focus_prev_workspace":
-            focus_workspace(prev_workspace_on_output(current_output()))
+            focus_workspace(state, prev_workspace_on_output(state, current_output(state)))
 
         case "focus_new_workspace":
-            op = current_output()
-            ws = new_workspace(op)
-            move_workspace_to_output_and_focus(ws, op)
+            op = current_output(state)
+            ws = new_workspace(state, op)
+            move_workspace_to_output_and_focus(state, ws, op)
 
         case "move_container_to_new_workspace":
-            c = current_container()
-            op = current_output()
-            ws = new_workspace(op)
-            move_workspace_to_output_and_focus(ws, op)
-            move_container_to_workspace(c, ws)
-            focus_container(c)
+            c = current_container(state)
+            op = current_output(state)
+            ws = new_workspace(state, op)
+            move_workspace_to_output_and_focus(state, ws, op)
+            move_container_to_workspace(state, c, ws)
+            focus_container(state, c)
 
         case "move_container_to_next_output":
-            c = current_container()
-            op = next_output()
-            move_container_to_output(c, op)
-            focus_container(c)
+            c = current_container(state)
+            op = next_output(state)
+            move_container_to_output(state, c, op)
+            focus_container(state, c)
 
         case "move_container_to_prev_output":
-            c = current_container()
-            op = prev_output()
-            move_container_to_output(c, op)
-            focus_container(c)
+            c = current_container(state)
+            op = prev_output(state)
+            move_container_to_output(state, c, op)
+            focus_container(state, c)
 
         case "move_workspace_to_next_output":
-            ws = current_workspace()
-            op = next_output()
-            move_workspace_to_output(ws, op)
-            focus_workspace(ws)
+            ws = current_workspace(state)
+            op = next_output(state)
+            move_workspace_to_output(state, ws, op)
+            focus_workspace(state, ws)
 
         case "move_workspace_to_prev_output":
-            ws = current_workspace()
-            op = prev_output()
-            move_workspace_to_output(ws, op)
-            focus_workspace(ws)
+            ws = current_workspace(state)
+            op = prev_output(state)
+            move_workspace_to_output(state, ws, op)
+            focus_workspace(state, ws)
 
         case "cycle_outputs_next":
-            ws = current_workspace()
-            cycle_outputs_next()
-            focus_workspace(ws)
+            cycle_outputs_next(state)
 
         case "cycle_outputs_prev":
-            ws = current_workspace()
-            cycle_outputs_prev()
-            focus_workspace(ws)
+            cycle_outputs_prev(state)
+
+        case _:
+            raise ValueError('unknown action: {!r}'.format(arg))
+
+def pidfile_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR', '/tmp')
+    return os.path.join(runtime_dir, 'sway-multimonitor.pid')
+
+def replace_running_daemon():
+    # Stop a previously started daemon (e.g. on `exec_always` after a config reload)
+    # and record our own pid in its place.
+    path = pidfile_path()
+    try:
+        with open(path) as f:
+            pid = int(f.read().strip())
+        with open('/proc/{}/cmdline'.format(pid), 'rb') as f:
+            if b'multimonitor' in f.read():
+                os.kill(pid, signal.SIGTERM)
+    except (OSError, ValueError):
+        pass
+    with open(path, 'w') as f:
+        f.write(str(os.getpid()))
+
+def handle_cycle(state, kind, steps):
+    # Run several presses of a cycle action as one step, e.g. "+5 workspaces on this output".
+    if steps == 0:
+        return
+    match kind:
+        case "workspace":
+            focus_workspace(state, workspace_on_output_after(state, current_output(state), steps))
+
+        case "output":
+            focus_output(state, output_after(state, steps))
+
+class ActionQueue:
+    # Actions from binding events, waiting for the daemon's worker thread.
+    # A run of queued cycle actions of the same kind (e.g. key repeats of $mod+Tab) is
+    # merged into one step, so the worker never acts on state that earlier presses are
+    # about to change. The worker also waits up to `window_secs` for more presses to merge.
+    def __init__(self, window_secs=0):
+        self.queue = queue.Queue()
+        self.window_secs = window_secs
+        self.pending = None
+
+    def put(self, action, received):
+        self.queue.put((action, received))
+
+    def get(self):
+        # Returns (action, steps, merged presses, time the first press was received).
+        action, received = self.pending or self.queue.get()
+        self.pending = None
+        if action not in CYCLE_ACTIONS:
+            return action, 0, 1, received
+        kind, steps = CYCLE_ACTIONS[action]
+        merged = 1
+        deadline = time.monotonic() + self.window_secs
+        while True:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    item = self.queue.get(timeout=timeout)
+                else:
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0] not in CYCLE_ACTIONS or CYCLE_ACTIONS[item[0]][0] != kind:
+                self.pending = item
+                break
+            steps += CYCLE_ACTIONS[item[0]][1]
+            merged += 1
+        return action, steps, merged, received
+
+class AioSway:
+    # Sway connection for the asyncio mode (swayipc_aio.AsyncConnection, or i3ipc.aio), run on an
+    # event loop in a background thread. `state` fetches outputs, workspaces and (if the action
+    # needs it) the tree concurrently and returns a State seeded with them. The State's
+    # commands are then sent through the loop, so `handle` runs unchanged.
+    # asyncio is only imported in this class, so the default mode doesn't pay for it on every keypress.
+    def __init__(self, socket_path=None):
+        import asyncio
+        import swayipc_aio
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.conn = self.run(swayipc_aio.connect_async(socket_path))
+
+    def run(self, coro):
+        import asyncio
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def prefetch(self, need_tree):
+        import asyncio
+        requests = [self.conn.get_outputs(), self.conn.get_workspaces()]
+        if need_tree:
+            requests.append(self.conn.get_tree())
+        return await asyncio.gather(*requests)
+
+    def state(self, action):
+        values = dict(zip(['outputs', 'workspaces', 'tree'], self.run(self.prefetch(action in TREE_ACTIONS))))
+        if 'tree' in values:
+            values['tree'] = swaytree.Tree(values['tree'].ipc_data)
+        state = State(self)
+        state.seed(**values)
+        return state
+
+    def command(self, cmd):
+        return self.run(self.conn.command(cmd))
+
+    def get_outputs(self):
+        return self.run(self.conn.get_outputs())
+
+    def get_workspaces(self):
+        return self.run(self.conn.get_workspaces())
+
+    def get_tree(self):
+        return self.run(self.conn.get_tree())
+
+    def on(self, event, handler):
+        async def subscribe():
+            self.conn.on(event, handler)
+            await self.conn.subscribe([event.split('::')[0]])
+        self.run(subscribe())
+
+    def main(self):
+        self.run(self.conn.main())
+
+    def close(self):
+        if hasattr(self.conn, 'close'):
+            self.run(self.conn.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+def daemon(coalesce_secs=0, use_aio=False):
+    # Run actions from sway's binding events over one long-lived connection,
+    # instead of paying for a new interpreter and IPC handshake on every keypress.
+    replace_running_daemon()
+    actions = ActionQueue(coalesce_secs)
+    if use_aio:
+        conn = AioSway()
+        make_state = conn.state
+    else:
+        conn = sway
+        make_state = lambda action: State(sway)
+
+    def binding_callback(self, e):
+        received = time.monotonic()
+        command = e.binding.command
+        if not command.startswith(BINDING_PREFIX):
+            return
+        action = command[len(BINDING_PREFIX):].strip()
+        if action not in ACTIONS:
+            print('unknown action in binding: {!r}'.format(command), file=sys.stderr, flush=True)
+            return
+        actions.put(action, received)
+
+    def worker():
+        while True:
+            action, steps, merged, received = actions.get()
+            try:
+                with swaytrace.action(action):
+                    state = make_state(action)
+                    if action in CYCLE_ACTIONS:
+                        handle_cycle(state, CYCLE_ACTIONS[action][0], steps)
+                    else:
+                        handle(state, action)
+            except Exception:
+                traceback.print_exc()
+                continue
+            elapsed_ms = (time.monotonic() - received) * 1000
+            if action in CYCLE_ACTIONS:
+                print('{} x{} ({:+d}): {:.1f}ms, {} ipc'.format(
+                    action, merged, steps, elapsed_ms, state.ipc_count), flush=True)
+            else:
+                print('{}: {:.1f}ms, {} ipc'.format(action, elapsed_ms, state.ipc_count), flush=True)
+
+    threading.Thread(target=worker, daemon=True).start()
+    conn.on(Event.BINDING, binding_callback)
+    conn.main()
 
 if __name__ == "__main__":
-    args = sys.argv[1:]
-    if len(args) != 1:
-        raise RuntimeError("Expect one arg")
-    handle(args[0])
-
+    parser = argparse.ArgumentParser()
+    parser.add_argument('action', choices=ACTIONS + ['daemon'],
+        help="an action for `handle`, or 'daemon'")
+    parser.add_argument('--async', dest='use_aio', action='store_true',
+        help='use the asyncio client, fetching state concurrently')
+    parser.add_argument('--coalesce-ms', type=float, default=0,
+        help='daemon: how long to wait for more presses of a cycle action to merge')
+    args = parser.parse_args()
+    if args.action == "daemon":
+        daemon(args.coalesce_ms / 1000, args.use_aio)
+    else:
+        aio = AioSway() if args.use_aio else None
+        with swaytrace.action(args.action):
+            handle(aio.state(args.action) if aio else State(sway), args.action)
+        if aio:
+            aio.close()
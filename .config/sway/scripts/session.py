@@ -0,0 +1,261 @@
+#! /usr/bin/env python3
+
+# Save the window layout to a file, and restore it in one go.
+#
+#   ./session.py snapshot <file>
+#   ./session.py restore [--timeout SECS] <file>
+#
+# A snapshot records every workspace with its output, its split containers
+# (layout and size) and its windows (app_id, class/instance, title, floating
+# geometry, and the command that started them). Restoring claims any windows that
+# are already open, spawns the rest all at once, waits for them to map, then moves,
+# nests and resizes everything with a single chained command.
+#
+# Windows are started with the launcher's command for a matching Program, or with
+# the command line of their process otherwise; windows sharing a process and a
+# command are started once. Titles are recorded but not matched on, since they
+# rarely survive a restart.
+
+import argparse
+import json
+import shlex
+import sys
+import time
+import swayipc
+import swaytrace
+from swayipc import Event
+from swaymatch import Matcher, MatcherIndex
+from launcher import NewWindows, programs_to_launch
+sway = swayipc.connect()
+
+# Temporary mark used to move windows next to each other while nesting them.
+MARK = '_session_restore'
+
+
+##
+# Snapshot
+##
+
+def process_cmd(pid):
+    try:
+        with open('/proc/{}/cmdline'.format(pid), 'rb') as f:
+            args = f.read().rstrip(b'\0').split(b'\0')
+    except OSError:
+        return None
+    return shlex.join(a.decode(errors='replace') for a in args)
+
+def known_programs():
+    try:
+        return programs_to_launch()
+    except RuntimeError:
+        return []
+
+def snapshot_window(c, programs):
+    props = c.ipc_data.get('window_properties') or {}
+    window = {
+        'app_id': c.ipc_data.get('app_id'),
+        'class': props.get('class'),
+        'instance': props.get('instance'),
+        'title': c.ipc_data.get('name'),
+        'pid': c.ipc_data.get('pid'),
+        'percent': c.ipc_data.get('percent'),
+    }
+    window['cmd'] = next((p.cmd for p in programs if p.matcher(c)), None) or process_cmd(window['pid'])
+    return window
+
+def snapshot_node(c, programs):
+    # Through ipc_data and attributes both clients have, so SWAYIPC=i3ipc works too.
+    if not c.ipc_data.get('nodes'):
+        return snapshot_window(c, programs)
+    return {
+        'layout': c.layout,
+        'percent': c.ipc_data.get('percent'),
+        'nodes': [snapshot_node(child, programs) for child in c.nodes],
+    }
+
+def snapshot(tree, workspaces):
+    programs = known_programs()
+    by_name = {ws.name: ws for ws in workspaces}
+    result = []
+    for ws in tree.workspaces():
+        floating = []
+        for c in ws.floating_nodes or ():
+            window = snapshot_window(c, programs)
+            window['rect'] = {k: c.ipc_data['rect'][k] for k in ('x', 'y', 'width', 'height')}
+            floating.append(window)
+        result.append({
+            'name': ws.name,
+            'output': by_name[ws.name].output if ws.name in by_name else None,
+            'visible': by_name[ws.name].visible if ws.name in by_name else False,
+            'focused': by_name[ws.name].focused if ws.name in by_name else False,
+            'layout': ws.layout,
+            'nodes': [snapshot_node(c, programs) for c in ws.nodes or ()],
+            'floating': floating,
+        })
+    return {'workspaces': result}
+
+
+##
+# Restore
+##
+
+def window_matcher(window):
+    if window['app_id']:
+        return Matcher(app_id=window['app_id'])
+    return Matcher(window_class=window['class'], window_instance=window['instance'])
+
+def windows_of(node):
+    if 'nodes' not in node:
+        return [node]
+    return [w for child in node['nodes'] for w in windows_of(child)]
+
+def claim_windows(session, timeout_secs):
+    # Find a window for every window in the snapshot: first among the open ones, then among
+    # those spawned for the rest. Returns {id(saved window): con_id}.
+    saved = [w for ws in session['workspaces']
+             for w in windows_of(ws) + ws['floating']]
+    waiting = MatcherIndex()
+    for w in saved:
+        waiting.add(window_matcher(w), id(w))
+    claimed = {}
+
+    def claim(c):
+        found = waiting.lookup(c)
+        if found:
+            waiting.discard(found[0])
+            claimed[found[0]] = c.id
+        return bool(found)
+
+    open_leaves = [c for ws in sway.get_tree().workspaces() for c in ws.leaves()]
+    for c in open_leaves:
+        claim(c)
+
+    new_windows = NewWindows()
+
+    def window_callback(self, e):
+        c = new_windows.candidate(e)
+        if c and claim(c):
+            new_windows.claim(c)
+            if not waiting:
+                sway.main_quit()
+
+    to_spawn = {}
+    for w in saved:
+        if id(w) not in claimed and w['cmd']:
+            to_spawn.setdefault((w['pid'] or id(w), w['cmd']), w['cmd'])
+    if to_spawn:
+        sway.on(Event.WINDOW, window_callback)
+        sway.command('; '.join('exec {}'.format(cmd) for cmd in to_spawn.values()))
+        sway.main(timeout=timeout_secs)
+        sway.off(window_callback)
+    return claimed
+
+def split_orientation(layout):
+    return 'v' if layout in ('splitv', 'stacking') else 'h'
+
+def nest_commands(node, con_ids):
+    # Commands that rebuild `node`'s split containers, given that its windows already sit
+    # in order in the container that will hold it. Each split container is created by
+    # splitting its first window and moving the rest of its windows in after it.
+    cmds = []
+    for child in node['nodes']:
+        leaves = [con_ids[id(w)] for w in windows_of(child) if id(w) in con_ids]
+        if 'nodes' not in child or not leaves:
+            continue
+        first = leaves[0]
+        if len(leaves) > 1:
+            cmds.append('[con_id={}] split {}'.format(first, split_orientation(child['layout'])))
+            cmds.append('[con_id={}] layout {}'.format(first, child['layout']))
+            for previous, con_id in zip(leaves, leaves[1:]):
+                cmds.append('[con_id={}] mark --add {}'.format(previous, MARK))
+                cmds.append('[con_id={}] move container to mark {}'.format(con_id, MARK))
+        cmds += nest_commands(child, con_ids)
+    return cmds
+
+def resize_commands(node, con_ids):
+    # Sizes are set on each child's first window; sway resizes the ancestor that sits in
+    # `node` along its direction. The last child takes what's left.
+    if node['layout'] not in ('splith', 'splitv'):
+        children = []
+    else:
+        children = [c for c in node['nodes']
+                    if any(id(w) in con_ids for w in windows_of(c))]
+    cmds = []
+    dimension = 'width' if node['layout'] == 'splith' else 'height'
+    for child in children[:-1]:
+        first = next(con_ids[id(w)] for w in windows_of(child) if id(w) in con_ids)
+        if child.get('percent'):
+            cmds.append('[con_id={}] resize set {} {}ppt'.format(
+                first, dimension, round(child['percent'] * 100)))
+    for child in node['nodes']:
+        if 'nodes' in child:
+            cmds += resize_commands(child, con_ids)
+    return cmds
+
+def restore_commands(session, con_ids):
+    cmds = []
+    for ws in session['workspaces']:
+        leaves = [con_ids[id(w)] for w in windows_of(ws) if id(w) in con_ids]
+        floating = [(con_ids[id(w)], w['rect']) for w in ws['floating'] if id(w) in con_ids]
+        if not leaves and not floating:
+            continue
+        for con_id in leaves:
+            cmds.append('[con_id={}] floating disable, move container to workspace {}'.format(
+                con_id, ws['name']))
+        if leaves:
+            cmds.append('[con_id={}] layout {}'.format(leaves[0], ws['layout']))
+        cmds += nest_commands(ws, con_ids)
+        cmds += resize_commands(ws, con_ids)
+        for con_id, rect in floating:
+            cmds.append(('[con_id={0}] move container to workspace {1}, floating enable, '
+                'resize set {2[width]} px {2[height]} px, move absolute position {2[x]} px {2[y]} px').format(
+                con_id, ws['name'], rect))
+        if ws['output']:
+            cmds.append('workspace {}, move workspace to output {}'.format(ws['name'], ws['output']))
+    cmds.append('unmark {}'.format(MARK))
+    # Show what was visible, and focus what was focused, last.
+    shown = sorted(session['workspaces'], key=lambda ws: (ws['focused'], not ws['visible']))
+    for ws in shown:
+        if ws['visible'] or ws['focused']:
+            cmds.append('workspace {}'.format(ws['name']))
+    return cmds
+
+def restore(session, timeout_secs):
+    start = time.monotonic()
+    con_ids = claim_windows(session, timeout_secs)
+    mapped = time.monotonic()
+    cmds = restore_commands(session, con_ids)
+    replies = sway.command('; '.join(cmds))
+    for reply in replies:
+        if not reply.success:
+            print('restore: {}'.format(reply.error), file=sys.stderr)
+    total = sum(len(windows_of(ws)) + len(ws['floating']) for ws in session['workspaces'])
+    print('{} of {} windows in {:.2f}s ({:.2f}s waiting for windows, {} commands in 1 message)'.format(
+        len(con_ids), total, time.monotonic() - start, mapped - start, len(cmds)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+    snapshot_parser = commands.add_parser('snapshot', help='save the current layout')
+    snapshot_parser.add_argument('file')
+    restore_parser = commands.add_parser('restore', help='start and lay out saved windows')
+    restore_parser.add_argument('--timeout', type=float, default=10,
+        help='seconds to wait for spawned windows to map')
+    restore_parser.add_argument('file')
+    args = parser.parse_args()
+
+    match args.command:
+        case 'snapshot':
+            with swaytrace.action('snapshot'):
+                session = snapshot(sway.get_tree(), sway.get_workspaces())
+            with open(args.file, 'w') as f:
+                json.dump(session, f, indent=1)
+        case 'restore':
+            with open(args.file) as f:
+                session = json.load(f)
+            with swaytrace.action('restore'):
+                restore(session, args.timeout)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+#! /usr/bin/env python3
+
+# Minimal sway IPC client.
+#
+# Talks the i3-ipc framing over $SWAYSOCK directly, and returns replies as plain
+# dicts (Node) that also allow attribute access and provide the handful of i3ipc
+# Con helpers the scripts use: leaves(), workspaces(), find_focused(), workspace().
+# This avoids importing i3ipc (and python-xlib) and building a Con object graph
+# on every keypress.
+#
+# Connection mirrors the parts of i3ipc.Connection the scripts need, so either can
+# be used; set SWAYIPC=i3ipc in the environment to use i3ipc instead. The asyncio
+# client, in place of i3ipc.aio, is in swayipc_aio.py, so that importing this
+# module doesn't pay for importing asyncio.
+# Set SWAYTRACE=<file> to trace requests and events (see swaytrace.py).
+
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+import swaytrace
+
+MAGIC = b'i3-ipc'
+HEADER = struct.Struct('=6sII')
+
+RUN_COMMAND     = 0
+GET_WORKSPACES  = 1
+SUBSCRIBE       = 2
+GET_OUTPUTS     = 3
+GET_TREE        = 4
+GET_VERSION     = 7
+
+MESSAGE_NAMES = {
+    RUN_COMMAND:    'run_command',
+    GET_WORKSPACES: 'get_workspaces',
+    SUBSCRIBE:      'subscribe',
+    GET_OUTPUTS:    'get_outputs',
+    GET_TREE:       'get_tree',
+    GET_VERSION:    'get_version',
+}
+
+# Event messages have the high bit of the type set; the rest is looked up here.
+EVENT_NAMES = {
+    0:  'workspace',
+    1:  'output',
+    2:  'mode',
+    3:  'window',
+    4:  'barconfig_update',
+    5:  'binding',
+    6:  'shutdown',
+    7:  'tick',
+    20: 'bar_state_update',
+    21: 'input',
+}
+
+
+class Event:
+    # Event names accepted by Connection.on (and by i3ipc.Connection.on).
+    WORKSPACE       = 'workspace'
+    OUTPUT          = 'output'
+    MODE            = 'mode'
+    WINDOW          = 'window'
+    BINDING         = 'binding'
+    SHUTDOWN        = 'shutdown'
+    TICK            = 'tick'
+    INPUT           = 'input'
+    WORKSPACE_FOCUS = 'workspace::focus'
+    WORKSPACE_INIT  = 'workspace::init'
+    WORKSPACE_EMPTY = 'workspace::empty'
+    WORKSPACE_MOVE  = 'workspace::move'
+    WINDOW_NEW      = 'window::new'
+    WINDOW_CLOSE    = 'window::close'
+    WINDOW_FOCUS    = 'window::focus'
+    WINDOW_TITLE    = 'window::title'
+    WINDOW_MOVE     = 'window::move'
+    WINDOW_FLOATING = 'window::floating'
+    WINDOW_MARK     = 'window::mark'
+
+
+class Node(dict):
+    # A reply object. Missing keys read as None, like unset i3ipc properties.
+    __slots__ = ('parent',)
+
+    def __getattr__(self, name):
+        return self.get(name)
+
+    @property
+    def ipc_data(self):
+        return self
+
+    def __iter__(self):
+        # Breadth-first over descendants, like i3ipc's Con. Sets `parent` on the way.
+        queue = deque()
+        queue.extend(self.children())
+        while queue:
+            con = queue.popleft()
+            yield con
+            queue.extend(con.children())
+
+    def children(self):
+        for key in ('nodes', 'floating_nodes'):
+            for child in self.get(key) or ():
+                child.parent = self
+                yield child
+
+    def descendants(self):
+        return list(self)
+
+    def leaves(self):
+        return [c for c in self
+                if not c.get('nodes') and c.get('type') == 'con' and c.parent.get('type') != 'dockarea']
+
+    def workspaces(self):
+        workspaces = []
+
+        def collect_workspaces(con):
+            if con.get('type') == 'workspace' and not con['name'].startswith('__'):
+                workspaces.append(con)
+                return
+            for c in con.get('nodes') or ():
+                c.parent = con
+                collect_workspaces(c)
+
+        collect_workspaces(self)
+        return workspaces
+
+    def find_focused(self):
+        for c in self:
+            if c.get('focused'):
+                return c
+        return None
+
+    def workspace(self):
+        # Only works for nodes reached by walking down from the tree root.
+        con = self
+        while con is not None:
+            if con.get('type') == 'workspace':
+                return con
+            con = con.parent
+        return None
+
+    def __hash__(self):
+        return id(self)
+
+    def __eq__(self, other):
+        return self is other
+
+
+def decode(payload):
+    return json.loads(payload, object_hook=Node)
+
+
+class Connection:
+    def __init__(self, socket_path=None):
+        socket_path = socket_path or os.environ.get('SWAYSOCK') or os.environ.get('I3SOCK')
+        if not socket_path:
+            raise RuntimeError('Failed to retrieve the sway IPC socket path')
+        self.socket_path = socket_path
+        self.cmd_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.cmd_socket.connect(socket_path)
+        self.cmd_lock = threading.Lock()
+        self.handlers = []
+        self.quitting = False
+        self.wake_r, self.wake_w = os.pipe()
+        self.sub_socket = None
+        self.subscriptions = set()
+        self.queued = deque()
+
+    ##
+    # Framing
+    ##
+
+    @staticmethod
+    def send(sock, msg_type, payload):
+        body = payload.encode()
+        sock.sendall(HEADER.pack(MAGIC, len(body), msg_type) + body)
+        return HEADER.size + len(body)
+
+    @staticmethod
+    def recv(sock):
+        header = recv_exactly(sock, HEADER.size)
+        magic, length, msg_type = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise RuntimeError('Bad magic in sway IPC reply')
+        return msg_type, recv_exactly(sock, length)
+
+    def message(self, msg_type, payload=''):
+        # Returns the raw reply bytes.
+        start = time.monotonic()
+        with self.cmd_lock:
+            sent = self.send(self.cmd_socket, msg_type, payload)
+            _, data = self.recv(self.cmd_socket)
+        swaytrace.request(MESSAGE_NAMES.get(msg_type, msg_type), start, sent, HEADER.size + len(data))
+        return data
+
+    ##
+    # Requests
+    ##
+
+    def command(self, payload):
+        return decode(self.message(RUN_COMMAND, payload))
+
+    def get_workspaces(self):
+        return decode(self.message(GET_WORKSPACES))
+
+    def get_outputs(self):
+        return decode(self.message(GET_OUTPUTS))
+
+    def get_tree(self):
+        return decode(self.message(GET_TREE))
+
+    def get_version(self):
+        return decode(self.message(GET_VERSION))
+
+    ##
+    # Events
+    ##
+
+    def subscribe(self, events):
+        # Subscribing is done on a separate socket, which stays open: events queue there from
+        # now on, so none are lost between subscribing and main(), or between main() calls.
+        events = set(events) - self.subscriptions
+        if not events:
+            return
+        if self.sub_socket is None:
+            self.sub_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sub_socket.connect(self.socket_path)
+        self.send(self.sub_socket, SUBSCRIBE, json.dumps(sorted(events)))
+        while True:
+            msg_type, data = self.recv(self.sub_socket)
+            if not msg_type & 0x80000000:
+                break
+            self.queued.append((msg_type, data))
+        self.subscriptions |= events
+
+    def on(self, event, handler):
+        event = getattr(event, 'value', event)
+        self.handlers.append((event, handler))
+        self.subscribe([event.split('::')[0]])
+
+    def off(self, handler):
+        self.handlers = [(e, h) for e, h in self.handlers if h != handler]
+
+    def emit(self, name, event):
+        full_name = '{}::{}'.format(name, event.get('change'))
+        for subscribed, handler in list(self.handlers):
+            if subscribed == name or subscribed == full_name:
+                handler(self, event)
+
+    def main(self, timeout=0.0):
+        # Handle events until main_quit() is called, sway goes away, or `timeout` seconds pass.
+        self.quitting = False
+        self.subscribe({e.split('::')[0] for e, _ in self.handlers})
+        deadline = time.monotonic() + timeout if timeout else None
+        while not self.quitting:
+            if self.queued:
+                msg_type, data = self.queued.popleft()
+            else:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                sockets = [self.wake_r] + ([self.sub_socket] if self.sub_socket else [])
+                readable, _, _ = select.select(sockets, [], [], remaining)
+                if self.wake_r in readable:
+                    os.read(self.wake_r, 64)
+                if self.sub_socket is None or self.sub_socket not in readable:
+                    continue
+                try:
+                    msg_type, data = self.recv(self.sub_socket)
+                except EOFError:
+                    # Sway went away; subscribe again from scratch next time.
+                    self.sub_socket.close()
+                    self.sub_socket = None
+                    self.subscriptions = set()
+                    break
+            if msg_type & 0x80000000:
+                start = time.monotonic()
+                name = EVENT_NAMES.get(msg_type & 0x7fffffff)
+                self.emit(name, decode(data))
+                swaytrace.event(name, start, HEADER.size + len(data))
+
+    def main_quit(self):
+        self.quitting = True
+        os.write(self.wake_w, b'x')
+
+
+def recv_exactly(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise EOFError('sway IPC socket closed')
+        buf += chunk
+    return bytes(buf)
+
+
+# Connect with this module's client, or with i3ipc if SWAYIPC=i3ipc.
+def connect(socket_path=None):
+    if os.environ.get('SWAYIPC') == 'i3ipc':
+        import i3ipc
+        conn = swaytrace.trace_i3ipc(i3ipc.Connection(socket_path=socket_path))
+        swaytrace.connected('i3ipc')
+        return conn
+    conn = Connection(socket_path=socket_path)
+    swaytrace.connected('swayipc')
+    return conn
@@ -0,0 +1,140 @@
+#! /usr/bin/env python3
+
+# asyncio client for sway IPC, the counterpart of swayipc.Connection (see swayipc.py)
+# with the interface of i3ipc.aio.Connection. Kept apart from swayipc.py so that the
+# scripts that only talk to sway synchronously don't import asyncio.
+#
+#   conn = await swayipc_aio.connect_async()
+#   workspaces, tree = await asyncio.gather(conn.get_workspaces(), conn.get_tree())
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+import swaytrace
+from swayipc import (EVENT_NAMES, GET_OUTPUTS, GET_TREE, GET_VERSION, GET_WORKSPACES,
+    HEADER, MAGIC, MESSAGE_NAMES, RUN_COMMAND, SUBSCRIBE, decode)
+
+
+class AsyncConnection:
+    # Requests are pipelined over one socket: each is written immediately and its reply
+    # future queued, and a reader task resolves replies in order (sway answers in order).
+    # So concurrent requests overlap instead of waiting for each other. Events arrive on
+    # the same socket once subscribed, and are told apart by the high bit of the type.
+    def __init__(self, socket_path=None):
+        socket_path = socket_path or os.environ.get('SWAYSOCK') or os.environ.get('I3SOCK')
+        if not socket_path:
+            raise RuntimeError('Failed to retrieve the sway IPC socket path')
+        self.socket_path = socket_path
+        self.handlers = []
+        self.subscriptions = set()
+        self.pending = deque()
+        self.main_future = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(self.socket_path)
+        self.reader_task = asyncio.ensure_future(self.read_messages())
+        await self.subscribe({e.split('::')[0] for e, _ in self.handlers})
+        return self
+
+    async def read_messages(self):
+        try:
+            while True:
+                header = await self.reader.readexactly(HEADER.size)
+                magic, length, msg_type = HEADER.unpack(header)
+                if magic != MAGIC:
+                    raise RuntimeError('Bad magic in sway IPC reply')
+                data = await self.reader.readexactly(length)
+                if msg_type & 0x80000000:
+                    start = time.monotonic()
+                    name = EVENT_NAMES.get(msg_type & 0x7fffffff)
+                    self.emit(name, decode(data))
+                    swaytrace.event(name, start, HEADER.size + len(data))
+                else:
+                    self.pending.popleft().set_result(data)
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            while self.pending:
+                self.pending.popleft().set_exception(EOFError('sway IPC socket closed'))
+            self.main_quit(_error=e)
+
+    async def message(self, msg_type, payload=''):
+        start = time.monotonic()
+        body = payload.encode()
+        reply = asyncio.get_running_loop().create_future()
+        self.pending.append(reply)
+        self.writer.write(HEADER.pack(MAGIC, len(body), msg_type) + body)
+        data = await reply
+        swaytrace.request(MESSAGE_NAMES.get(msg_type, msg_type), start,
+            HEADER.size + len(body), HEADER.size + len(data))
+        return data
+
+    async def command(self, payload):
+        return decode(await self.message(RUN_COMMAND, payload))
+
+    async def get_workspaces(self):
+        return decode(await self.message(GET_WORKSPACES))
+
+    async def get_outputs(self):
+        return decode(await self.message(GET_OUTPUTS))
+
+    async def get_tree(self):
+        return decode(await self.message(GET_TREE))
+
+    async def get_version(self):
+        return decode(await self.message(GET_VERSION))
+
+    async def subscribe(self, events):
+        events = {getattr(e, 'value', e) for e in events} - self.subscriptions
+        if not events:
+            return
+        self.subscriptions |= events
+        await self.message(SUBSCRIBE, json.dumps(sorted(events)))
+
+    def on(self, event, handler):
+        # Handlers may be plain functions or coroutine functions.
+        event = getattr(event, 'value', event)
+        self.handlers.append((event, handler))
+        if hasattr(self, 'writer'):
+            asyncio.ensure_future(self.subscribe([event.split('::')[0]]))
+
+    def off(self, handler):
+        self.handlers = [(e, h) for e, h in self.handlers if h != handler]
+
+    def emit(self, name, event):
+        full_name = '{}::{}'.format(name, event.get('change'))
+        for subscribed, handler in list(self.handlers):
+            if subscribed == name or subscribed == full_name:
+                result = handler(self, event)
+                if asyncio.iscoroutine(result):
+                    asyncio.ensure_future(result)
+
+    async def close(self):
+        self.reader_task.cancel()
+        self.writer.close()
+
+    async def main(self):
+        self.main_future = asyncio.get_running_loop().create_future()
+        await self.main_future
+
+    def main_quit(self, _error=None):
+        if self.main_future is not None and not self.main_future.done():
+            if _error:
+                self.main_future.set_exception(_error)
+            else:
+                self.main_future.set_result(None)
+        self.main_future = None
+
+
+# Connect with AsyncConnection, or with i3ipc.aio if SWAYIPC=i3ipc.
+# (i3ipc.aio's requests block the event loop, so they don't overlap.)
+async def connect_async(socket_path=None):
+    if os.environ.get('SWAYIPC') == 'i3ipc':
+        from i3ipc.aio import Connection as AioConnection
+        conn = await AioConnection(socket_path).connect()
+        swaytrace.connected('i3ipc.aio')
+        return conn
+    conn = await AsyncConnection(socket_path).connect()
+    swaytrace.connected('swayipc')
+    return conn
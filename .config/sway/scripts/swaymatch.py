@@ -0,0 +1,106 @@
+#! /usr/bin/env python3
+
+# Declarative window matchers, and an index for routing windows to them.
+#
+# A Matcher describes a window by app_id, X11 class/instance, a title regex and a
+# predicate on its geometry. A MatcherIndex keys matchers on app_id or on
+# (class, instance), so finding the matchers for a window is a dict lookup per key
+# plus checking the few matchers found there, however many matchers there are.
+#
+#   index = MatcherIndex()
+#   index.add(Matcher(app_id='term_htop'), 'htop')
+#   index.lookup(container)     # -> ['htop'] or []
+
+import re
+from typing import Callable
+
+
+def window_keys(c):
+    # The index keys a window can be found under.
+    props = c.ipc_data.get('window_properties') or {}
+    return [('app_id', c.ipc_data.get('app_id')),
+            ('class', props.get('class'), props.get('instance'))]
+
+
+class Matcher:
+    def __init__(self, app_id:str=None, window_class:str=None, window_instance:str=None,
+            title:str=None, geometry:Callable=None):
+        self.app_id          = app_id
+        self.window_class    = window_class
+        self.window_instance = window_instance
+        self.title           = re.compile(title) if title is not None else None
+        self.geometry        = geometry
+
+    def __repr__(self):
+        fields = ('app_id', 'window_class', 'window_instance', 'title', 'geometry')
+        return 'Matcher({})'.format(', '.join(
+            '{}={!r}'.format(f, getattr(self, f)) for f in fields if getattr(self, f) is not None))
+
+    def key(self):
+        # The index key for this matcher, or None if it has to be checked against every window.
+        if self.app_id is not None:
+            return ('app_id', self.app_id)
+        if self.window_class is not None and self.window_instance is not None:
+            return ('class', self.window_class, self.window_instance)
+        return None
+
+    def criteria(self):
+        # The matcher as sway criteria, or None if it checks geometry, which criteria can't.
+        if self.geometry is not None:
+            return None
+        patterns = [
+            ('app_id', self.app_id and '^{}$'.format(re.escape(self.app_id))),
+            ('class', self.window_class and '^{}$'.format(re.escape(self.window_class))),
+            ('instance', self.window_instance and '^{}$'.format(re.escape(self.window_instance))),
+            ('title', self.title and self.title.pattern),
+        ]
+        return ' '.join('{}="{}"'.format(name, pattern.replace('"', '\\"'))
+                        for name, pattern in patterns if pattern)
+
+    def __call__(self, c):
+        props = c.ipc_data.get('window_properties') or {}
+        return (
+            (self.app_id is None or c.ipc_data.get('app_id') == self.app_id) and
+            (self.window_class is None or props.get('class') == self.window_class) and
+            (self.window_instance is None or props.get('instance') == self.window_instance) and
+            (self.title is None or bool(self.title.search(c.ipc_data.get('name') or ''))) and
+            (self.geometry is None or self.geometry(c.geometry)) )
+
+
+class MatcherIndex:
+    def __init__(self):
+        self.by_key = {}
+        self.keys = {}
+        self.order = {}
+        self.added = 0
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        return iter(list(self.order))
+
+    def add(self, matcher:Matcher, value):
+        # Matchers without a key go under None and are checked against every window.
+        key = matcher.key()
+        self.by_key.setdefault(key, []).append((matcher, value))
+        self.keys[value] = key
+        self.order[value] = self.added
+        self.added += 1
+
+    def discard(self, value):
+        if value not in self.order:
+            return
+        key = self.keys.pop(value)
+        del self.order[value]
+        entries = [(m, v) for m, v in self.by_key[key] if v != value]
+        if entries:
+            self.by_key[key] = entries
+        else:
+            del self.by_key[key]
+
+    def lookup(self, c):
+        # Values of every matcher that accepts `c`, in the order they were added.
+        found = [v for key in window_keys(c) + [None]
+                 for m, v in self.by_key.get(key, ()) if m(c)]
+        return sorted(found, key=self.order.__getitem__)
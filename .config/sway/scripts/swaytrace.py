@@ -0,0 +1,166 @@
+#! /usr/bin/env python3
+
+# Opt-in tracing for the sway scripts.
+#
+# With SWAYTRACE=<file> in the environment, every IPC request and reply, every
+# event received, and every action the scripts run is appended to <file> as one
+# JSON object per line, with monotonic timestamps, message types and sizes.
+# Each process also records how long it took to get from exec to its first IPC
+# connection (interpreter startup plus imports).
+#
+# Summarize a trace with:
+#
+#   ./swaytrace.py [--slowest N] <file>
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_FILE = os.environ.get('SWAYTRACE')
+enabled = bool(TRACE_FILE)
+
+local = threading.local()
+lock = threading.Lock()
+action_count = 0
+trace_file = None
+
+
+def record(kind, **fields):
+    global trace_file
+    fields['kind'] = kind
+    fields['pid'] = os.getpid()
+    fields['script'] = os.path.basename(sys.argv[0])
+    fields.setdefault('action', getattr(local, 'action', None))
+    fields.setdefault('action_id', getattr(local, 'action_id', None))
+    line = json.dumps(fields) + '\n'
+    with lock:
+        if trace_file is None:
+            trace_file = open(TRACE_FILE, 'a', buffering=1)
+        trace_file.write(line)
+
+def process_age_ms():
+    # Time since this process was exec'd, from its start time in /proc.
+    with open('/proc/self/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    start_secs = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    return (time.clock_gettime(time.CLOCK_BOOTTIME) - start_secs) * 1000
+
+def connected(backend):
+    if enabled:
+        record('startup', t=time.monotonic(), backend=backend, duration_ms=process_age_ms())
+
+def request(msg_type, start, sent, received):
+    if enabled:
+        end = time.monotonic()
+        record('request', t=start, type=msg_type, sent=sent, received=received,
+            duration_ms=(end - start) * 1000)
+
+def event(name, start, received):
+    if enabled:
+        record('event', t=start, type=name, received=received,
+            duration_ms=(time.monotonic() - start) * 1000)
+
+@contextmanager
+def action(name):
+    # Tag the IPC done inside the block with `name`, and record the block's duration.
+    global action_count
+    if not enabled:
+        yield
+        return
+    with lock:
+        action_count += 1
+        action_id = '{}-{}'.format(os.getpid(), action_count)
+    outer = getattr(local, 'action', None), getattr(local, 'action_id', None)
+    local.action, local.action_id = name, action_id
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record('action', t=start, duration_ms=(time.monotonic() - start) * 1000)
+        local.action, local.action_id = outer
+
+def trace_i3ipc(conn):
+    # Wrap an i3ipc.Connection's private request method, for SWAYIPC=i3ipc.
+    if not enabled:
+        return conn
+    message = conn._message
+
+    def traced(message_type, payload):
+        start = time.monotonic()
+        data = message(message_type, payload)
+        name = 'run_command' if message_type.name == 'COMMAND' else message_type.name.lower()
+        # Sizes include the 14-byte header, as for swayipc.
+        request(name, start, 14 + len(payload.encode()), 14 + len(data.encode()))
+        return data
+
+    conn._message = traced
+    return conn
+
+
+##
+# Summary
+##
+
+def load(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def summarize(records, slowest=10):
+    startups = {}
+    actions = {}
+    for r in records:
+        if r['kind'] == 'startup':
+            startups.setdefault(r['script'], []).append(r['duration_ms'])
+        elif r['kind'] == 'action':
+            actions.setdefault(r['action_id'], {'name': r['action'], 'script': r['script'],
+                'total': r['duration_ms'], 'ipc': {}})
+    for r in records:
+        if r['kind'] == 'request' and r['action_id'] in actions:
+            ipc = actions[r['action_id']]['ipc']
+            calls, ms = ipc.get(r['type'], (0, 0))
+            ipc[r['type']] = (calls + 1, ms + r['duration_ms'])
+
+    if startups:
+        print('startup (exec to first connection)')
+        for script, samples in sorted(startups.items()):
+            print('  {:<24} {:>5} runs {:>9.1f} ms mean'.format(
+                script, len(samples), sum(samples) / len(samples)))
+
+    by_name = {}
+    for a in actions.values():
+        by_name.setdefault((a['script'], a['name']), []).append(a)
+    if by_name:
+        print('actions (mean per run)')
+        for (script, name), runs in sorted(by_name.items()):
+            total = sum(a['total'] for a in runs) / len(runs)
+            types = sorted({t for a in runs for t in a['ipc']})
+            ipc_ms = sum(ms for a in runs for _, ms in a['ipc'].values()) / len(runs)
+            print('  {} {}: {} runs, {:.1f} ms total, {:.1f} ms ipc, {:.1f} ms other'.format(
+                script, name, len(runs), total, ipc_ms, total - ipc_ms))
+            for t in types:
+                calls = sum(a['ipc'].get(t, (0, 0))[0] for a in runs) / len(runs)
+                ms = sum(a['ipc'].get(t, (0, 0))[1] for a in runs) / len(runs)
+                print('      {:<16} {:>5.1f} calls {:>9.1f} ms'.format(t, calls, ms))
+
+    calls = sorted((r for r in records if r['kind'] in ('request', 'event')),
+        key=lambda r: r['duration_ms'], reverse=True)[:slowest]
+    if calls:
+        print('slowest calls')
+        for r in calls:
+            print('  {:>9.1f} ms  {:<8} {:<16} {:>9} bytes  {} {}'.format(
+                r['duration_ms'], r['kind'], r['type'], r.get('received', 0),
+                r['script'], r['action'] or ''))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--slowest', type=int, default=10)
+    parser.add_argument('file')
+    args = parser.parse_args()
+    summarize(load(args.file), args.slowest)
+
+if __name__ == "__main__":
+    main()
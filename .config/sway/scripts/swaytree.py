@@ -0,0 +1,196 @@
+#! /usr/bin/env python3
+
+# A compact, read-only view of sway's tree.
+#
+# The GET_TREE reply is walked once into parallel lists (id, parent index, type,
+# name, app_id, class, instance, pid, focused), with the answers to the usual
+# questions worked out on the way: which nodes are windows, which workspace each
+# node is on, which node is focused and the path to it, and how many windows each
+# workspace has. Queries are then list and dict lookups instead of walks over an
+# object per container. Nodes are handed out as small TreeNode views.
+#
+#   tree = swaytree.get_tree(conn)
+#   tree.find_focused().workspace().name
+#   tree.workspace_is_empty('3')
+
+import json
+
+import swayipc
+
+
+class TreeNode:
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    def __repr__(self):
+        return 'TreeNode(id={}, type={!r}, name={!r})'.format(self.id, self.type, self.name)
+
+    def __eq__(self, other):
+        return isinstance(other, TreeNode) and self.tree is other.tree and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    @property
+    def id(self):
+        return self.tree.ids[self.index]
+
+    @property
+    def type(self):
+        return self.tree.types[self.index]
+
+    @property
+    def name(self):
+        return self.tree.names[self.index]
+
+    @property
+    def app_id(self):
+        return self.tree.app_ids[self.index]
+
+    @property
+    def window_class(self):
+        return self.tree.classes[self.index]
+
+    @property
+    def window_instance(self):
+        return self.tree.instances[self.index]
+
+    @property
+    def pid(self):
+        return self.tree.pids[self.index]
+
+    @property
+    def focused(self):
+        return self.tree.focused_flags[self.index]
+
+    @property
+    def parent(self):
+        return self.tree.node(self.tree.parents[self.index])
+
+    def workspace(self):
+        return self.tree.node(self.tree.workspace_of[self.index])
+
+
+class Tree:
+    __slots__ = ('ids', 'parents', 'types', 'names', 'app_ids', 'classes', 'instances', 'pids',
+                 'focused_flags', 'index_of', 'workspace_of', 'leaf_indexes',
+                 'workspace_indexes', 'focused_index', 'window_counts')
+
+    def __init__(self, root:dict):
+        self.ids = []
+        self.parents = []
+        self.types = []
+        self.names = []
+        self.app_ids = []
+        self.classes = []
+        self.instances = []
+        self.pids = []
+        self.focused_flags = []
+        self.workspace_of = []
+        self.leaf_indexes = []
+        self.workspace_indexes = []
+        self.focused_index = None
+        self.window_counts = {}
+
+        ids, parents, types, names = self.ids, self.parents, self.types, self.names
+        app_ids, classes, instances, pids = self.app_ids, self.classes, self.instances, self.pids
+        focused_flags, workspace_of = self.focused_flags, self.workspace_of
+        window_counts = self.window_counts
+
+        # Preorder, so a node's parent (and its workspace) is always known before the node.
+        stack = [(root, -1)]
+        while stack:
+            node, parent = stack.pop()
+            i = len(ids)
+            get = node.get
+            node_type = get('type')
+            props = get('window_properties')
+            nodes = get('nodes')
+            ids.append(get('id'))
+            parents.append(parent)
+            types.append(node_type)
+            names.append(get('name'))
+            app_ids.append(get('app_id'))
+            classes.append(props.get('class') if props else None)
+            instances.append(props.get('instance') if props else None)
+            pids.append(get('pid'))
+            focused = bool(get('focused'))
+            focused_flags.append(focused)
+            if focused:
+                self.focused_index = i
+
+            if node_type == 'workspace':
+                workspace = i
+                if not names[i].startswith('__'):
+                    self.workspace_indexes.append(i)
+                    window_counts.setdefault(names[i], 0)
+            else:
+                workspace = workspace_of[parent] if parent >= 0 else -1
+            workspace_of.append(workspace)
+
+            # The same windows as Node.leaves().
+            if node_type == 'con' and not nodes and types[parent] != 'dockarea':
+                self.leaf_indexes.append(i)
+                if workspace >= 0:
+                    window_counts[names[workspace]] = window_counts.get(names[workspace], 0) + 1
+
+            floating = get('floating_nodes')
+            if floating:
+                stack.extend((child, i) for child in reversed(floating))
+            if nodes:
+                stack.extend((child, i) for child in reversed(nodes))
+
+        self.index_of = {con_id: i for i, con_id in enumerate(self.ids)}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(json.loads(data))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def node(self, index):
+        return TreeNode(self, index) if index >= 0 else None
+
+    @property
+    def root(self):
+        return self.node(0)
+
+    def find_by_id(self, con_id):
+        index = self.index_of.get(con_id)
+        return self.node(index) if index is not None else None
+
+    def leaves(self):
+        return [TreeNode(self, i) for i in self.leaf_indexes]
+
+    def workspaces(self):
+        return [TreeNode(self, i) for i in self.workspace_indexes]
+
+    def find_focused(self):
+        return self.node(self.focused_index) if self.focused_index is not None else None
+
+    def focused_path(self):
+        # From the root down to the focused node.
+        path = []
+        i = self.focused_index if self.focused_index is not None else -1
+        while i >= 0:
+            path.append(TreeNode(self, i))
+            i = self.parents[i]
+        return path[::-1]
+
+    def workspace_of_id(self, con_id):
+        index = self.index_of.get(con_id)
+        return self.node(self.workspace_of[index]) if index is not None else None
+
+    def workspace_is_empty(self, name):
+        return not self.window_counts.get(name)
+
+
+def get_tree(conn):
+    # With the built-in client, parse the raw reply without building a Node per container.
+    if isinstance(conn, swayipc.Connection):
+        return Tree.from_json(conn.message(swayipc.GET_TREE))
+    return Tree(conn.get_tree().ipc_data)
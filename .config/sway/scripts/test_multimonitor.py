@@ -0,0 +1,117 @@
+#! /usr/bin/env python3
+
+# Tests for picking a new workspace number.
+#
+#   python3 -m unittest test_multimonitor
+
+import os
+import types
+import unittest
+
+from fake_sway import FakeSway, make_fixture
+
+server = None
+multimonitor = None
+
+
+def setUpModule():
+    global server, multimonitor
+    # multimonitor connects on import, so point it at a fake first.
+    server = FakeSway(make_fixture(outputs=1, workspaces_per_output=1)).start()
+    os.environ['SWAYSOCK'] = server.socket_path
+    import multimonitor
+
+def tearDownModule():
+    server.stop()
+
+
+def workspace(num, output='DP-1', name=None):
+    return types.SimpleNamespace(num=num, name=name or str(num), output=output)
+
+def state_with(workspaces):
+    by_output = {}
+    for ws in workspaces:
+        by_output.setdefault(ws.output, []).append(ws)
+    return types.SimpleNamespace(
+        workspace_numbers=multimonitor.WorkspaceNumbers(workspaces),
+        workspaces_by_output=by_output,
+    )
+
+def output(name='DP-1'):
+    return types.SimpleNamespace(name=name)
+
+
+class FirstFreeTest(unittest.TestCase):
+    def first_free(self, nums, start, stop=None):
+        return multimonitor.WorkspaceNumbers([workspace(n) for n in nums]).first_free(start, stop)
+
+    def test_nothing_used(self):
+        self.assertEqual(self.first_free([], 1), 1)
+
+    def test_gap(self):
+        self.assertEqual(self.first_free([1, 2, 4, 5], 1), 3)
+
+    def test_start_unused(self):
+        self.assertEqual(self.first_free([1, 2, 4], 3), 3)
+
+    def test_run_to_the_end(self):
+        self.assertEqual(self.first_free([1, 2, 3], 1), 4)
+
+    def test_duplicate_numbers(self):
+        # `1` and `1:web` both have number 1.
+        self.assertEqual(self.first_free([1, 1, 2], 1), 3)
+        self.assertEqual(self.first_free([1, 2, 2, 2, 3, 5], 1), 4)
+
+    def test_unnumbered_ignored(self):
+        self.assertEqual(self.first_free([-1, 1], 1), 2)
+
+    def test_stop(self):
+        self.assertEqual(self.first_free([11, 12], 11, 13), None)
+        self.assertEqual(self.first_free([11], 11, 13), 12)
+
+    def test_matches_linear_scan(self):
+        import random
+        rng = random.Random(0)
+        for _ in range(500):
+            nums = [rng.randrange(1, 15) for _ in range(rng.randrange(0, 20))]
+            start = rng.randrange(1, 16)
+            expected = next(n for n in range(start, 100) if n not in nums)
+            self.assertEqual(self.first_free(nums, start), expected, (nums, start))
+
+
+class NewWorkspaceTest(unittest.TestCase):
+    def tearDown(self):
+        multimonitor.OUTPUT_WORKSPACE_RANGES.clear()
+
+    def test_after_smallest_on_output(self):
+        state = state_with([workspace(1, 'DP-1'), workspace(2, 'DP-1'), workspace(5, 'DP-2')])
+        self.assertEqual(multimonitor.new_workspace(state, output('DP-2')).num, 6)
+        self.assertEqual(multimonitor.new_workspace(state, output('DP-1')).num, 3)
+
+    def test_collision_with_other_output(self):
+        state = state_with([workspace(1, 'DP-1'), workspace(2, 'DP-2')])
+        self.assertEqual(multimonitor.new_workspace(state, output('DP-1')).num, 3)
+
+    def test_named_duplicate(self):
+        state = state_with([workspace(1), workspace(1, name='1:web'), workspace(2)])
+        ws = multimonitor.new_workspace(state, output())
+        self.assertEqual((ws.num, ws.name), (3, '3'))
+
+    def test_empty_output(self):
+        state = state_with([workspace(1, 'DP-1')])
+        self.assertEqual(multimonitor.new_workspace(state, output('DP-2')).num, 2)
+
+    def test_output_range(self):
+        multimonitor.OUTPUT_WORKSPACE_RANGES['DP-2'] = range(11, 21)
+        state = state_with([workspace(1, 'DP-1'), workspace(11, 'DP-2'), workspace(12, 'DP-1')])
+        self.assertEqual(multimonitor.new_workspace(state, output('DP-2')).num, 13)
+
+    def test_output_range_full(self):
+        # Falls back to numbering after the output's smallest workspace.
+        multimonitor.OUTPUT_WORKSPACE_RANGES['DP-2'] = range(11, 13)
+        state = state_with([workspace(11, 'DP-2'), workspace(12, 'DP-2'), workspace(13, 'DP-1')])
+        self.assertEqual(multimonitor.new_workspace(state, output('DP-2')).num, 14)
+
+
+if __name__ == "__main__":
+    unittest.main()